@@ -0,0 +1,589 @@
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# ------------------------------------------------------------------------------
+# Micro-benchmarks for the caption hot path.
+#
+# Usage:
+#   python bench.py phrases            # phrase stripping, 10 -> 1,000 phrases
+#   python bench.py styling            # Unicode styling, 1,024/4,096-char captions
+#   python bench.py host               # one process per bot vs host.py, memory/startup
+#   python bench.py health             # Flask thread vs asyncio health endpoint
+#   python bench.py fileindex          # file_unique_id index, 10k -> 1M entries
+#   python bench.py rules              # rules.toml compiled rules vs captions.py
+#   python bench.py classify           # caption-format classification cost
+#   python bench.py golden             # golden-corpus outputs + ns/op regression gate
+# ------------------------------------------------------------------------------
+
+def timeit(fn, arg, min_time: float = 0.5) -> float:
+    """Return the mean seconds per call of fn(arg), run for at least min_time."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn(arg)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / loops
+        loops *= 2
+
+def random_words(rng: random.Random, count: int) -> str:
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return " ".join(
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 9)))
+        for _ in range(count)
+    )
+
+# ------------------------------------------------------------------------------
+# Phrase stripping: the original replace-per-phrase loop vs PhraseStripper
+# ------------------------------------------------------------------------------
+def naive_strip(phrases):
+    def strip(text: str) -> str:
+        for phrase in phrases:
+            text = text.replace(phrase, "")
+        text = re.sub(r'^\s*\d+\)\.?\s*', '', text, flags=re.MULTILINE)
+        text = re.sub(r'\b(?:0\d{2}|[1-2]\d{2}|300)\)\.', '', text)
+        return text.strip()
+    return strip
+
+def chained_inputs(rng: random.Random, phrases: list, count: int) -> list:
+    """Captions built from whole phrases and their halves run together, so
+    removing one phrase can join its neighbours into another."""
+    pieces = [" ", "\n", "x", "01)."]
+    for phrase in phrases:
+        cut = rng.randint(1, max(1, len(phrase) - 1))
+        pieces += [phrase, phrase[:cut], phrase[cut:]]
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+def bench_phrases(args):
+    from captions import UNWANTED_PHRASES
+    from phrases import PhraseStripper
+
+    rng = random.Random(42)
+    # short lists run the loop once a phrase is found, long ones _ReplaceChain
+    overlapping = ["".join(rng.choice("ab »") for _ in range(rng.randint(1, 5))) for _ in range(60)]
+    for phrases in (UNWANTED_PHRASES, overlapping, UNWANTED_PHRASES * 2 + rng.sample(overlapping, 20)):
+        naive, stripper = naive_strip(phrases), PhraseStripper(phrases)
+        for text in chained_inputs(rng, phrases, 20000):
+            assert naive(text) == stripper(text), (phrases, text)
+    print("OK: PhraseStripper matches the replace-per-phrase loop on chained and overlapping phrases")
+    print(f"{'phrases':>8} {'naive MB/s':>12} {'stripper MB/s':>14} {'speedup':>8}")
+    for count in (10, 30, 100, 300, 1000):
+        phrases = [f"»Download By➵ᴹᴿ°{random_words(rng, 2)}࿐⁰³" for _ in range(count)]
+        lines = []
+        for i in range(40):
+            lines.append(f"{i:03}). {random_words(rng, 8)}")
+            if i % 4 == 0:
+                lines.append(rng.choice(phrases))
+        caption = "\n".join(lines)[:4096]
+
+        naive = naive_strip(phrases)
+        stripper = PhraseStripper(phrases)
+        assert naive(caption) == stripper(caption)
+
+        size_mb = len(caption.encode()) / 1e6
+        naive_rate = size_mb / timeit(naive, caption, args.min_time)
+        fast_rate = size_mb / timeit(stripper, caption, args.min_time)
+        print(f"{count:>8} {naive_rate:>12.1f} {fast_rate:>14.1f} {fast_rate / naive_rate:>7.1f}x")
+
+# ------------------------------------------------------------------------------
+# Unicode styling: the per-character loop the bots used vs str.translate tables
+# ------------------------------------------------------------------------------
+def loop_math_sans_plain(text: str) -> str:
+    result = []
+    for ch in text:
+        if 'A' <= ch <= 'Z':
+            result.append(chr(ord(ch) - ord('A') + 0x1D5A0))
+        elif 'a' <= ch <= 'z':
+            result.append(chr(ord(ch) - ord('a') + 0x1D5BA))
+        elif '0' <= ch <= '9':
+            result.append(chr(ord(ch) - ord('0') + 0x1D7E2))
+        else:
+            result.append(ch)
+    return ''.join(result)
+
+def dict_math_sans(text: str) -> str:
+    sans_map = {
+        **{chr(i): chr(0x1D5A0 + i - 65) for i in range(65, 91)},
+        **{chr(i): chr(0x1D5BA + i - 97) for i in range(97, 123)},
+        **{chr(i): chr(0x1D7E2 + i - 48) for i in range(48, 58)}
+    }
+    return ''.join(sans_map.get(c, c) for c in text)
+
+def bench_styling(args):
+    from styling import to_math_sans_plain, format_number
+
+    rng = random.Random(42)
+    print(f"{'input':>14} {'loop us':>9} {'dict us':>9} {'translate us':>13} {'speedup':>8}")
+    for size in (1024, 4096):
+        caption = (random_words(rng, size) + " Class Date » 12 March 2024 ")[:size]
+        assert loop_math_sans_plain(caption) == dict_math_sans(caption) == to_math_sans_plain(caption)
+        loop_t = timeit(loop_math_sans_plain, caption, args.min_time)
+        dict_t = timeit(dict_math_sans, caption, args.min_time)
+        fast_t = timeit(to_math_sans_plain, caption, args.min_time)
+        print(f"{f'{size} chars':>14} {loop_t * 1e6:>9.1f} {dict_t * 1e6:>9.1f} {fast_t * 1e6:>13.2f} {loop_t / fast_t:>7.1f}x")
+
+    loop_t = timeit(lambda n: loop_math_sans_plain(str(n).zfill(3)), 33, args.min_time)
+    fast_t = timeit(format_number, 33, args.min_time)
+    print(f"{'format_number':>14} {loop_t * 1e6:>9.2f} {'':>9} {fast_t * 1e6:>13.3f} {loop_t / fast_t:>7.1f}x")
+
+# ------------------------------------------------------------------------------
+# Multi-bot hosting: N separate processes (the old run.sh model) vs one host.py
+# process with N profiles. Both sides run `host.py --dry-run`, which imports
+# everything and builds the clients, counters and handlers without connecting,
+# so the numbers are interpreter + import + per-bot setup cost. Startup is wall
+# time from spawning the process(es) until all have exited; RSS is peak RSS,
+# summed over processes on the multi-process side. MB/bot is the host's extra
+# RSS per added bot.
+# ------------------------------------------------------------------------------
+HOST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "host.py")
+
+def bot_profile(i: int, format: str) -> str:
+    return f'[[bot]]\nname = "bot{i}"\nformat = "{format}"\ntoken_env = "BENCH_TOKEN_{i}"\n'
+
+def dry_run(configs, cwd: str, env: dict):
+    """Start one host.py --dry-run per config in parallel; return (seconds, [stats])."""
+    start = time.perf_counter()
+    procs = [
+        subprocess.Popen([sys.executable, HOST, "--config", config, "--dry-run"],
+                         cwd=cwd, env=env, stdout=subprocess.PIPE, text=True)
+        for config in configs
+    ]
+    stats = [json.loads(proc.communicate()[0].splitlines()[-1]) for proc in procs]
+    return time.perf_counter() - start, stats
+
+def bench_host(args):
+    from captions import FORMATS
+
+    formats = sorted(FORMATS)
+    print(f"{'bots':>5} {'procs MB':>9} {'host MB':>8} {'MB/bot':>7} {'procs s':>8} {'host s':>7}")
+    host_base = None
+    for count in (1, 2, 4, 6, 12):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, API_ID="1", API_HASH="bench")
+            singles = []
+            for i in range(count):
+                env[f"BENCH_TOKEN_{i}"] = f"{i}:bench"
+                singles.append(os.path.join(tmp, f"bot{i}.toml"))
+                with open(singles[-1], "w") as f:
+                    f.write(bot_profile(i, formats[i % len(formats)]))
+            combined = os.path.join(tmp, "bots.toml")
+            with open(combined, "w") as f:
+                f.write("\n".join(bot_profile(i, formats[i % len(formats)]) for i in range(count)))
+
+            procs_s, procs_rss = min(
+                (t, sum(s["max_rss_kb"] for s in stats))
+                for t, stats in (dry_run(singles, tmp, env) for _ in range(args.repeat))
+            )
+            host_s, host_rss = min(
+                (t, stats[0]["max_rss_kb"])
+                for t, stats in (dry_run([combined], tmp, env) for _ in range(args.repeat))
+            )
+
+        if host_base is None:
+            host_base = host_rss
+        per_bot = f"{(host_rss - host_base) / (count - 1) / 1024:.2f}" if count > 1 else "-"
+        print(f"{count:>5} {procs_rss / 1024:>9.1f} {host_rss / 1024:>8.1f} {per_bot:>7} "
+              f"{procs_s:>8.2f} {host_s:>7.2f}")
+
+# ------------------------------------------------------------------------------
+# Health endpoint: the Flask-in-a-thread server every script used to start vs
+# health.HealthServer on the event loop. Cold start is wall time from spawning
+# the process until /health answers 200; RSS is read from /proc once it does.
+# ------------------------------------------------------------------------------
+FLASK_HEALTH = '''
+import sys
+from threading import Thread
+from flask import Flask
+app = Flask(__name__)
+@app.route("/health")
+def health_check():
+    return "OK", 200
+thread = Thread(target=lambda: app.run(port=int(sys.argv[1]), host="127.0.0.1"), daemon=True)
+thread.start()
+thread.join()
+'''
+
+ASYNCIO_HEALTH = '''
+import asyncio, sys
+from health import HealthServer, LoopLagMonitor
+async def main():
+    monitor = LoopLagMonitor()
+    monitor.start()
+    await HealthServer([], monitor, host="127.0.0.1", port=int(sys.argv[1])).start()
+    await asyncio.Event().wait()
+asyncio.run(main())
+'''
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def rss_kb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def cold_start(script: str, timeout: float = 30.0):
+    """Return (seconds until /health answered, RSS in KB) for a server script."""
+    import urllib.request
+
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", script, str(port)], cwd=os.path.dirname(HOST),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start, rss_kb(proc.pid)
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        proc.kill()
+        proc.wait()
+
+def bench_health(args):
+    print(f"{'server':>8} {'cold start ms':>14} {'RSS MB':>7}")
+    for name, script in (("flask", FLASK_HEALTH), ("asyncio", ASYNCIO_HEALTH)):
+        try:
+            runs = [cold_start(script) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{name:>8} failed: {e}")
+            continue
+        seconds, rss = min(runs)
+        rss_text = f"{rss / 1024:.1f}" if rss else "-"
+        print(f"{name:>8} {seconds * 1e3:>14.1f} {rss_text:>7}")
+
+# ------------------------------------------------------------------------------
+# File index: insert and lookup cost as the table grows. put() only queues on
+# the caller (max put ms is what the event loop would see); write s is until
+# the writer thread has written everything, table doublings included. Lookups
+# should stay flat.
+# ------------------------------------------------------------------------------
+def bench_fileindex(args):
+    from fileindex import FileIndex
+
+    print(f"{'entries':>9} {'put us':>7} {'max put ms':>11} {'write s':>8} {'hit us':>7} {'miss us':>8} {'table MB':>9}")
+    for count in (10_000, 100_000, 1_000_000):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "bench")
+            index = FileIndex(base, initial_capacity=1 << 10)
+            ids = [f"AgADBAAD{i:010d}" for i in range(count)]
+            caption = "<blockquote>[𝟢𝟢𝟣] 𝖢𝗅𝖺𝗌𝗌 𝖣𝖺𝗍𝖾 » 𝟣𝟤 𝖬𝖺𝗋𝖼𝗁</blockquote>\nLecture"
+
+            start = time.perf_counter()
+            max_put = 0.0
+            for i, file_id in enumerate(ids):
+                t = time.perf_counter()
+                index.put(-1001234567890, file_id, i, caption)
+                max_put = max(max_put, time.perf_counter() - t)
+            put_t = (time.perf_counter() - start) / count
+            index.close()
+            write_t = time.perf_counter() - start
+            index = FileIndex(base)
+
+            sample = ids[::max(1, count // 10_000)]
+            start = time.perf_counter()
+            for file_id in sample:
+                index.get(-1001234567890, file_id)
+            hit_t = (time.perf_counter() - start) / len(sample)
+            start = time.perf_counter()
+            for file_id in sample:
+                index.get(-1001234567891, file_id)
+            miss_t = (time.perf_counter() - start) / len(sample)
+
+            size_mb = os.path.getsize(index.index_path) / 1e6
+            index.close()
+        print(f"{count:>9} {put_t * 1e6:>7.1f} {max_put * 1e3:>11.1f} {write_t:>8.1f} {hit_t * 1e6:>7.1f} "
+              f"{miss_t * 1e6:>8.1f} {size_mb:>9.1f}")
+
+# ------------------------------------------------------------------------------
+# Caption rules: the hand-written functions in captions.py vs the same formats
+# compiled from rules.toml (outputs are asserted equal first). Compiled rules
+# are expected to be at least as fast, except class_date: its phrases are
+# matched in folded form (fold = true) and the hand-written version only
+# replaces exact spellings. With the watermark spelled as configured, the
+# folded match costs one extra scan (about 1-2 us, ~0.9x); a restyled
+# watermark has to be folded, which costs a few times more (golden unicode
+# cases).
+# ------------------------------------------------------------------------------
+RULE_SAMPLES = {
+    "class_date": "01). Arithmetic Class-12 By » Gagan Pratap Sir (Careerwill)\nClass Date » 12 March 2024 "
+                  "Percentage Part-3 »Download By➵ᴹᴿ°sachin🌙࿐⁰³",
+    "title": "Title: 015) ATM Batch Algebra Linear Equations Part 2 || Maths by Aditya Ranjan Sir "
+             "➸ᴹᴿ°ℂr\u200c𝕒c\u200ck\u200cєr࿐⁰³ @channel",
+    "indian_geography": "Lecture 07 Indian Geography- Rivers of the Himalayan system and their tributaries "
+                        "➸ᴹᴿ°ℂr\u200c𝕒c\u200ck\u200cєr࿐⁰³",
+    "reas": "12 04 Reas Blood relations and direction sense, practice set ᒪᑭᖇᑭᗪᐯ join for more",
+    "slash": "3. Simple Interest (Part-2)! // Compound interest basics Batch 2024 Target SSC CGL",
+    "mkv": "File: Batch 2024: [720p] VIDEO - Profit and Loss - Lecture 05 [Hindi].mkv",
+}
+
+def bench_rules(args):
+    from captions import FORMATS
+    from rules import load_rules
+
+    rules = load_rules(os.path.join(os.path.dirname(HOST), "rules.toml"))
+    print(f"{'format':>17} {'hand us':>8} {'rules us':>9} {'speedup':>8}")
+    for name, caption in RULE_SAMPLES.items():
+        hand, compiled = FORMATS[name], rules[name].render
+        assert hand(caption, 33) == compiled(caption, 33), name
+        hand_t = timeit(lambda c: hand(c, 33), caption, args.min_time)
+        rule_t = timeit(lambda c: compiled(c, 33), caption, args.min_time)
+        print(f"{name:>17} {hand_t * 1e6:>8.2f} {rule_t * 1e6:>9.2f} {hand_t / rule_t:>7.2f}x")
+
+# ------------------------------------------------------------------------------
+# Format classification: the classifier's generated literal checks vs the same
+# signatures as one regex alternation (one group per format, one finditer
+# pass), on the sample captions alone and padded with ~1 KB of filler text
+# ------------------------------------------------------------------------------
+def signature_regex(markers) -> str:
+    parts = []
+    for marker in markers:
+        if "find" in marker:
+            literal = re.escape(marker["find"])
+            parts.append(f"(?i:{literal})" if marker.get("ignore_case") else literal)
+        else:
+            parts.append(marker["regex"])
+    return ".*?".join(parts)
+
+def bench_classify(args):
+    from classifier import FormatClassifier
+    from rules import load_rules
+
+    rules = load_rules(os.path.join(os.path.dirname(HOST), "rules.toml"))
+    classifier = FormatClassifier(rules, "plain")
+    alternation = re.compile("|".join(f"({signature_regex(rules[name].signature)})" for name in classifier.formats), re.S)
+
+    def one_pass(caption):
+        best = None
+        for match in alternation.finditer(caption):
+            if best is None or match.lastindex < best:
+                best = match.lastindex
+        return None if best is None else classifier.formats[best - 1]
+
+    filler = random_words(random.Random(0), 150)
+    cases = [("none", filler)]
+    for name, caption in RULE_SAMPLES.items():
+        cases += [(name, caption), (f"pad+{name}", filler + " " + caption)]
+    print(f"{'caption':>22} {'chars':>6} {'format':>17} {'literal us':>11} {'alternation us':>15}")
+    for label, caption in cases:
+        chosen = classifier.classify(caption)
+        assert chosen == one_pass(caption), label
+        literal_t = timeit(classifier.classify, caption, args.min_time)
+        regex_t = timeit(one_pass, caption, args.min_time)
+        print(f"{label:>22} {len(caption):>6} {chosen or '-':>17} {literal_t * 1e6:>11.2f} {regex_t * 1e6:>15.2f}")
+
+# ------------------------------------------------------------------------------
+# Golden corpus: every caption format, every implementation (the hand-written
+# reference in captions.py, the compiled rules.toml, and the rules behind the
+# render cache the bots run, timed on cache hits), over golden/corpus.json, a
+# versioned set of real-shaped captions: short ones, 4,096-character ones,
+# missing markers, heavy Unicode and edge cases.
+#
+#   python bench.py golden                  # check outputs, report, gate on baseline
+#   python bench.py golden --update         # rewrite golden/outputs.json
+#   python bench.py golden --save-baseline  # record this machine's ns/op
+#   python bench.py golden --no-gate        # outputs and report only
+#
+# Outputs must match golden/outputs.json exactly (the implementations are
+# locked separately: the rules also match restyled watermarks). Time is the
+# best of --repeat batches, in ns per caption for each format and corpus kind;
+# peak KB is the largest transient allocation of one call (tracemalloc). A
+# format/kind more than --threshold slower than golden/baseline.json (committed)
+# fails the run, once a longer re-measurement confirms it; a missing baseline
+# fails too, unless --no-gate is given.
+# The gate compares each format's time relative to calibration_work() timed in
+# alternating batches on the same captions, so a machine that is busier or
+# slower than when the baseline was saved does not fail it.
+# ------------------------------------------------------------------------------
+GOLDEN_DIR = os.path.join(os.path.dirname(HOST), "golden")
+GOLDEN_NUMBER = 7
+
+def calibration_work(caption: str, num: int) -> str:
+    """Fixed string/regex work, the yardstick for the regression gate."""
+    text = " ".join(caption.split()).lower()
+    return re.sub(r"\d+", str(num), text.replace("class", "lecture")).upper()
+
+def golden_implementations():
+    from captions import FORMATS
+    from rules import load_rules
+
+    rules = load_rules(os.path.join(os.path.dirname(HOST), "rules.toml"))
+    return {
+        "captions": dict(FORMATS),
+        "rules": {name: rules[name].render for name in FORMATS},
+        "cached": {name: rules[name].cached_render for name in FORMATS},
+    }
+
+def _calibrated_loops(fn, captions: list, batch_time: float) -> int:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            for caption in captions:
+                fn(caption, GOLDEN_NUMBER)
+        if time.perf_counter() - start >= batch_time:
+            return loops
+        loops *= 2
+
+def _batch_ns(fn, captions: list, loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        for caption in captions:
+            fn(caption, GOLDEN_NUMBER)
+    return (time.perf_counter() - start) / (loops * len(captions)) * 1e9
+
+def timed_ns(fn, captions: list, repeat: int, batch_time: float = 0.02):
+    """(best ns per caption, median ratio to calibration_work) over `repeat`
+    batches of fn, each followed by a batch of calibration_work on the same
+    captions, so the ratio follows the machine's load from batch to batch."""
+    loops = _calibrated_loops(fn, captions, batch_time)
+    calibration_loops = _calibrated_loops(calibration_work, captions, batch_time)
+    best, ratios = float("inf"), []
+    for _ in range(repeat):
+        ns = _batch_ns(fn, captions, loops)
+        best = min(best, ns)
+        ratios.append(ns / _batch_ns(calibration_work, captions, calibration_loops))
+    return best, statistics.median(ratios)
+
+def peak_bytes(fn, captions: list) -> int:
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        peak = 0
+        for caption in captions:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(caption, GOLDEN_NUMBER)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        return peak
+    finally:
+        tracemalloc.stop()
+
+def bench_golden(args):
+    with open(os.path.join(GOLDEN_DIR, "corpus.json"), encoding="utf-8") as f:
+        corpus = json.load(f)
+    implementations = golden_implementations()
+    outputs = {
+        impl: {name: {case["id"]: fn(case["caption"], GOLDEN_NUMBER) for case in corpus["cases"]}
+               for name, fn in functions.items()}
+        for impl, functions in implementations.items()
+    }
+    outputs_path = os.path.join(GOLDEN_DIR, "outputs.json")
+    if args.update:
+        with open(outputs_path, "w", encoding="utf-8") as f:
+            json.dump({"corpus_version": corpus["version"], **outputs}, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        print(f"Wrote {outputs_path}")
+
+    failures = []
+    with open(outputs_path, encoding="utf-8") as f:
+        golden = json.load(f)
+    if golden.get("corpus_version") != corpus["version"]:
+        failures.append(f"outputs.json is for corpus version {golden.get('corpus_version')}, "
+                        f"corpus is version {corpus['version']} (run with --update)")
+    for impl, by_format in outputs.items():
+        for name, by_case in by_format.items():
+            for case_id, output in by_case.items():
+                expected = golden.get(impl, {}).get(name, {}).get(case_id)
+                if output != expected:
+                    failures.append(f"{impl}.{name} {case_id}: output differs from golden\n"
+                                    f"  expected {expected!r}\n  got      {output!r}")
+
+    kinds = {}
+    for case in corpus["cases"]:
+        kinds.setdefault(case["kind"], []).append(case["caption"])
+    timings = {}
+    print(f"{'format':>17} {'kind':>8} {'cases':>6} {'captions ns':>12} {'rules ns':>10} {'cached ns':>10} "
+          f"{'captions KB':>12} {'rules KB':>9}")
+    for name in implementations["captions"]:
+        for kind, captions in kinds.items():
+            row = {}
+            for impl, functions in implementations.items():
+                ns, relative = timed_ns(functions[name], captions, args.repeat)
+                timings[f"{impl}/{name}/{kind}"] = relative
+                row[impl] = (ns, peak_bytes(functions[name], captions) / 1024)
+            print(f"{name:>17} {kind:>8} {len(captions):>6} {row['captions'][0]:>12.0f} {row['rules'][0]:>10.0f} "
+                  f"{row['cached'][0]:>10.0f} {row['captions'][1]:>12.1f} {row['rules'][1]:>9.1f}")
+
+    baseline_path = args.baseline or os.path.join(GOLDEN_DIR, "baseline.json")
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump({"python": sys.version.split()[0], "relative": timings}, f, indent=1)
+            f.write("\n")
+        print(f"Wrote {baseline_path}")
+    elif args.no_gate:
+        print("Regression gate skipped (--no-gate)")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)["relative"]
+        for key, relative in timings.items():
+            if key not in baseline:
+                continue
+            if relative > baseline[key] * (1 + args.threshold):
+                # Confirm with a longer measurement before failing
+                impl, name, kind = key.split("/")
+                relative = min(relative, timed_ns(implementations[impl][name], kinds[kind], args.repeat * 3)[1])
+            if relative > baseline[key] * (1 + args.threshold):
+                failures.append(f"{key}: {relative / baseline[key] - 1:+.0%} vs baseline "
+                                f"(threshold {args.threshold:.0%})")
+    else:
+        failures.append(f"no baseline at {baseline_path}; run with --save-baseline, or --no-gate to skip the gate")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        raise SystemExit(1)
+    print(f"OK: {len(corpus['cases'])} captions x {len(implementations['captions'])} formats x "
+          f"{len(implementations)} implementations match golden outputs")
+
+def main():
+    parser = argparse.ArgumentParser(description="Caption pipeline micro-benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per measurement")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    sub.add_parser("phrases", help="phrase stripping throughput vs phrase count").set_defaults(func=bench_phrases)
+    sub.add_parser("styling", help="Unicode styling vs per-character loops").set_defaults(func=bench_styling)
+    host = sub.add_parser("host", help="memory and startup: one process per bot vs host.py")
+    host.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    host.set_defaults(func=bench_host)
+    health = sub.add_parser("health", help="cold start and memory: Flask thread vs asyncio health endpoint")
+    health.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    health.set_defaults(func=bench_health)
+    sub.add_parser("fileindex", help="file_unique_id index insert/lookup vs size").set_defaults(func=bench_fileindex)
+    sub.add_parser("rules", help="rules.toml compiled rules vs hand-written captions.py").set_defaults(func=bench_rules)
+    sub.add_parser("classify", help="caption-format classification cost").set_defaults(func=bench_classify)
+    golden = sub.add_parser("golden", help="golden-corpus outputs and ns/op regression gate")
+    golden.add_argument("--update", action="store_true", help="rewrite golden/outputs.json from the current code")
+    golden.add_argument("--save-baseline", action="store_true", help="record this machine's ns/op as the baseline")
+    golden.add_argument("--baseline", help="baseline file (default: golden/baseline.json)")
+    golden.add_argument("--no-gate", action="store_true", help="skip the baseline regression gate")
+    golden.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown vs the baseline")
+    golden.add_argument("--repeat", type=int, default=7, help="timed batches per measurement (best is kept)")
+    golden.set_defaults(func=bench_golden)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import re
+
+from phrases import PhraseStripper
+from styling import to_math_sans_plain, format_number
+
+# ------------------------------------------------------------------------------
+# Caption formats.
+#
+# Each bot script used to carry its own copy of process_caption; they live here
+# now so that one process can serve several formats and tools (the renumber
+# CLI, benchmarks) can use them without starting a bot. FORMATS maps a format
+# name to render(caption, num) -> full HTML caption for video number `num`.
+#
+#   class_date        bot.py    "Class Date »" split, phrase stripping
+#   title             bot1.py   "Title:" ... ")" ... "||" ... end marker
+#   indian_geography  bo.py     "Indian Geography-" ... end marker
+#   reas              eng.py    "Reas " / second number, "ᒪᑭᖇᑭᗪᐯ" cut-off
+#   slash             nidhi.py  title before "//", details after it
+#   mkv               pr.py     text after the second ":" up to ".mkv"
+#
+# The bots now render captions with the same formats compiled from rules.toml
+# (rules.py); these functions stay as the reference implementation that
+# `python bench.py rules` checks the compiled rules against.
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+# Wrap text in an HTML blockquote
+# ------------------------------------------------------------------------------
+def blockquote(text: str) -> str:
+    return f"<blockquote>{text}</blockquote>"
+
+# ------------------------------------------------------------------------------
+# class_date (bot.py): remove unwanted phrases and markers from the caption
+# (the stripper is compiled once at startup and reused for every caption)
+# ------------------------------------------------------------------------------
+UNWANTED_PHRASES = [
+    "Batch » Maths Spl-30 (Pre+Mains)",
+    "»Download By➵➵ᴹᴿ°ຮ𝖆𝖈𝖍𝖎𝖓࿐²⁴⁷",
+    "»Download By➵ᴹᴿ°ຮ𝖆𝖈𝖍𝖎𝖓࿐²⁴⁷",
+    "»Download By➵ᴹᴿ°ຮ𝖆𝖈𝖍𝖎𝖓🌙࿐⁰³",
+    "»Download By➵ᴹᴿ°sachin🌙࿐⁰³",
+    "»Download By➵ᴹᴿ°𝐒𝐀𝐂𝐇𝐈𝐍🌙࿐⁰³",
+    "»Download By➵ᴹᴿ°ꜱᴀᴄʜ𝖎𝖓🌙࿐⁰³",
+    "Class By » Gagan Pratap Sir",
+    "By » Gagan Pratap Sir (Careerwill)",
+    "By » Gagan Pratap Sir",
+    "•"
+]
+
+remove_unwanted_sentences = PhraseStripper(UNWANTED_PHRASES)
+
+# ------------------------------------------------------------------------------
+# Clean prefix: remove any leading numbering from the prefix text.
+# ------------------------------------------------------------------------------
+def clean_prefix(prefix: str) -> str:
+    return re.sub(r'^\s*\d+\)\.?\s*', '', prefix).strip()
+
+# ------------------------------------------------------------------------------
+# class_date (bot.py): process caption:
+#   - If "Class Date »" is found: split into prefix (before) and suffix (from "Class Date »" onward).
+#     * Remove the marker "Class Date »" from the caption.
+#     * Also remove "31 October 2024" from the suffix if present.
+#     * Force suffix to one line.
+#     * Convert suffix to Mathematical Sans‑Serif Plain.
+#     * Prepend numbering (in square brackets) to suffix and wrap in blockquote.
+#     * Append the cleaned prefix (unchanged) below.
+#   - If "Class Date »" is not found: blockquote only the numbering and then append
+#     the rest of the cleaned caption unchanged.
+# ------------------------------------------------------------------------------
+def process_class_date_caption(text: str, numbering: str) -> str:
+    cleaned_text = remove_unwanted_sentences(text)
+    lower_text = cleaned_text.lower()
+    marker = "class date »"  # marker to detect (case-insensitive)
+    idx = lower_text.find(marker)
+    if idx != -1:
+        prefix = cleaned_text[:idx].strip()
+        suffix = cleaned_text[idx + len(marker):].strip()
+        # Remove the date "31 October 2024" if present in the suffix
+        suffix = suffix.replace("31 October 2024", "").strip()
+        suffix_one_line = ' '.join(suffix.split())
+        converted_suffix = to_math_sans_plain(suffix_one_line)
+        block_text = f"[{numbering}] {converted_suffix}"
+        blockquoted = blockquote(block_text)
+        clean_pref = clean_prefix(prefix)
+        return f"{blockquoted}\n{clean_pref}"
+    else:
+        blockquoted = blockquote(f"[{numbering}]")
+        return f"{blockquoted}\n{cleaned_text}"
+
+# ------------------------------------------------------------------------------
+# title (bot1.py): clean extracted text:
+# - Remove unwanted phrases "ATM Batch" and "Atm Maths" (case-insensitive)
+# - Remove any non-alphabet characters (keeping spaces)
+# - Normalize whitespace.
+# ------------------------------------------------------------------------------
+def clean_title_text(text: str) -> str:
+    text = re.sub(r"(?i)\bATM Batch\b", "", text)
+    text = re.sub(r"(?i)\bAtm Maths\b", "", text)
+    cleaned = re.sub(r"[^A-Za-z\s]", "", text)
+    return " ".join(cleaned.split())
+
+# ------------------------------------------------------------------------------
+# title (bot1.py): process caption:
+#
+# - Find "Title:" (case-insensitive)
+# - Then find the first closing parenthesis ")" after "Title:".
+# - Then find the delimiter "||" after the ")".
+# - Then find the final marker "➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³" after "||".
+#
+# The blockquoted part is the cleaned text between ")" and "||" (excluding both).
+# The non-blockquoted part is the text from after "||" up to the final marker.
+# ------------------------------------------------------------------------------
+def process_title_caption(text: str, numbering: str) -> str:
+    lower_text = text.lower()
+    idx_title = lower_text.find("title:")
+    if idx_title == -1:
+        return blockquote(f"[{numbering}]") + "\n" + text.strip()
+    idx_closeParen = text.find(")", idx_title)
+    if idx_closeParen == -1:
+        return blockquote(f"[{numbering}]") + "\n" + text.strip()
+    idx_delim = text.find("||", idx_closeParen)
+    if idx_delim == -1:
+        return blockquote(f"[{numbering}]") + "\n" + text.strip()
+    idx_marker = text.find("➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³", idx_delim)
+    if idx_marker == -1:
+        return blockquote(f"[{numbering}]") + "\n" + text.strip()
+    
+    # Extract text between ")" and "||" for blockquoting.
+    block_text = text[idx_closeParen + 1: idx_delim].strip()
+    cleaned_text = clean_title_text(block_text)
+    
+    # Extract text from after "||" up to the final marker.
+    non_block_text = text[idx_delim + len("||"): idx_marker].strip()
+    
+    return blockquote(f"[{numbering}] {cleaned_text}") + "\n" + non_block_text
+
+# ------------------------------------------------------------------------------
+# indian_geography (bo.py): process caption:
+#
+# Expected structure in the caption:
+#   ... Indian Geography- <non-blockquoted text> ➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³ ...
+#
+# The bot extracts:
+#   - The fixed text "Indian Geography" for blockquoting (with numbering).
+#   - The text between "Indian Geography-" and "➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³" for non-blockquoting.
+# ------------------------------------------------------------------------------
+def process_geography_caption(text: str, numbering: str) -> str:
+    lower_text = text.lower()
+    start_marker = "indian geography-"
+    end_marker = "➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³"
+    idx_start = lower_text.find(start_marker)
+    idx_end = text.find(end_marker, idx_start)
+    if idx_start != -1 and idx_end != -1:
+        # Fixed blockquoted part is always "Indian Geography" with numbering.
+        block_text = f"[{numbering}] Indian Geography"
+        # Extract text after the dash and before the final marker.
+        content_text = text[idx_start + len(start_marker): idx_end].strip()
+        return blockquote(block_text) + "\n" + content_text
+    else:
+        # Fallback: if markers are not found, simply prepend numbering.
+        return blockquote(f"[{numbering}]") + "\n" + text.strip()
+
+# ------------------------------------------------------------------------------
+# reas (eng.py): text after "Reas " (or the second number) up to "ᒪᑭᖇᑭᗪᐯ"
+# ------------------------------------------------------------------------------
+CLASS_LABEL = to_math_sans_plain("Class")
+
+def process_reas_content(original):
+    marker = "ᒪᑭᖇᑭᗪᐯ"
+    content_part = original.split(marker, 1)[0].strip()
+    
+    reas_pos = content_part.find("Reas ")
+    if reas_pos != -1:
+        return content_part[reas_pos+4:].strip()
+    
+    numbers = list(re.finditer(r'\d+', content_part))
+    if len(numbers) >= 2:
+        return content_part[numbers[1].end():].strip()
+    
+    return content_part.strip()
+
+def render_reas(caption: str, num: int) -> str:
+    base = f"{CLASS_LABEL} [{format_number(num)}]"
+    processed = process_reas_content(caption)
+    return f"<blockquote>{base}</blockquote>\n{processed}"
+
+# ------------------------------------------------------------------------------
+# slash (nidhi.py): title before "//", details after it up to "Batch"
+# ------------------------------------------------------------------------------
+def clean_slash_text(text: str) -> str:
+    # Remove numbered bullets (e.g., "1.", "2.")
+    text = re.sub(r'\b\d+\.\s*', '', text)
+    # Remove non-alphanumeric characters except spaces
+    text = re.sub(r'[^A-Za-z0-9\s]', '', text)
+    return ' '.join(text.split())
+
+def process_slash_caption(text: str, numbering: str) -> str:
+    # Split at first "//"
+    parts = text.split('//', 1)
+    before_delim = clean_slash_text(parts[0].strip())
+    after_delim = parts[1].strip() if len(parts) > 1 else ''
+
+    # Convert both numbering and text to sans-serif
+    formatted_number = to_math_sans_plain(numbering.zfill(3))
+    formatted_text = to_math_sans_plain(before_delim)
+    blockquote_text = f"[{formatted_number}] {formatted_text}"
+
+    # Remove everything after Batch (case-insensitive, multi-line)
+    if after_delim:
+        after_delim = re.sub(r'(?si)Batch.*', '', after_delim).strip()
+
+    return blockquote(blockquote_text) + (f"\n{after_delim}" if after_delim else '')
+
+# ------------------------------------------------------------------------------
+# mkv (pr.py): text after the second ":" up to ".mkv", minus tags
+# ------------------------------------------------------------------------------
+def process_mkv_caption(text: str, numbering: str) -> str:
+    quote = blockquote(f"[{numbering}]")
+    snippet = text
+    try:
+        cols = [m.start() for m in re.finditer(r":", text)]
+        start = cols[1] + 1 if len(cols) >= 2 else 0
+        end_mkv = text.lower().find('.mkv')
+        end = end_mkv if end_mkv != -1 else len(text)
+        snippet = text[start:end]
+    except:
+        pass
+    snippet = re.sub(r"\bVIDEO\b", "", snippet, flags=re.IGNORECASE)
+    snippet = re.sub(r"\[[^\]]*\]", "", snippet)
+    snippet = re.sub(r"^[:]+", "", snippet).strip()
+    snippet = re.sub(r"\s*-+\s*", " ", snippet)
+    snippet = ' '.join(snippet.split())
+    return f"{quote}\n{snippet}"
+
+# ------------------------------------------------------------------------------
+# Format registry
+# ------------------------------------------------------------------------------
+def render_class_date(caption: str, num: int) -> str:
+    return process_class_date_caption(caption, format_number(num))
+
+def render_title(caption: str, num: int) -> str:
+    return process_title_caption(caption, format_number(num))
+
+def render_indian_geography(caption: str, num: int) -> str:
+    return process_geography_caption(caption, format_number(num))
+
+def render_slash(caption: str, num: int) -> str:
+    return process_slash_caption(caption, str(num))
+
+def render_mkv(caption: str, num: int) -> str:
+    return process_mkv_caption(caption, format_number(num))
+
+FORMATS = {
+    "class_date": render_class_date,
+    "title": render_title,
+    "indian_geography": render_indian_geography,
+    "reas": render_reas,
+    "slash": render_slash,
+    "mkv": render_mkv,
+}
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import time
+
+from health import metric
+from jsonlog import log
+
+# ------------------------------------------------------------------------------
+# Startup catch-up of messages posted while the bot was down.
+#
+# ChatCounters keeps the last message id handled in every chat. When the bot
+# starts, each of those chats is scanned forward from there with get_messages
+# in batches of up to 200 ids; as in renumber.py, the next batch is fetched
+# while the current one is being handled. A batch goes to
+# MediaHandler.catch_up(): one counter reservation for its videos, edits
+# through the bot's EditScheduler, so the backlog drains at the rate limits.
+# At most `concurrency` chats are caught up at a time, and a chat holds at most
+# one batch of edits plus one prefetched batch.
+#
+# Live media of a chat still catching up is held and handed to MediaHandler
+# once the chat is done, so numbers keep message_id order across the restart.
+# The scan of a chat ends just before the first held live message, or, while
+# none has arrived, after a batch in which every id is empty (the end of the
+# chat, or a run of 200 deleted messages). A chat that cannot be read (bot
+# removed, no rights) is reported and switched to live updates.
+#
+# Progress is logged after every batch and exported on /metrics (remaining
+# chats; caught-up videos are counted in the bot's Metrics).
+#
+# On shutdown, stop() ends every scan after its current batch and drops the
+# held live messages; they were never marked handled, so the next start picks
+# them up again. Caption edits still unfinished at the shutdown deadline (their
+# numbers are already taken) are saved to `unfinished_path` and done first
+# when the bot starts again. Those of a chat that cannot be read at that point
+# stay in the file for the next start.
+# ------------------------------------------------------------------------------
+BATCH_SIZE = 200
+
+class CatchUp:
+    def __init__(self, client, media, name: str, unfinished_path: str = None,
+                 batch_size: int = BATCH_SIZE, concurrency: int = 16):
+        self.client = client
+        self.media = media
+        self.name = name
+        self.unfinished_path = unfinished_path
+        self.batch_size = min(batch_size, BATCH_SIZE)
+        self.concurrency = concurrency
+        self.held = {}
+        self.scanned = 0
+        self.numbered = 0
+        self.stopping = False
+        self.unfinished = self._load_unfinished()
+
+    def begin(self):
+        """Start holding live media of every known chat; call before connecting."""
+        self.held = {chat_id: [] for chat_id in self.media.counters.handled_chats()}
+
+    def hold(self, message) -> bool:
+        """Keep message for later if its chat is still catching up."""
+        held = self.held.get(message.chat.id)
+        if held is None:
+            return False
+        held.append(message)
+        return True
+
+    def stop(self):
+        self.stopping = True
+
+    async def run(self):
+        try:
+            if self.unfinished:
+                await self.resume()
+            if not self.held:
+                return
+            started = time.monotonic()
+            log.info("catch_up_started", bot=self.name, chats=len(self.held))
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def one(chat_id):
+                async with semaphore:
+                    try:
+                        await self.chat(chat_id, started)
+                    except Exception as e:
+                        log.error("catch_up_failed", bot=self.name, chat_id=chat_id, stage="catch_up",
+                                  outcome="error", error=str(e), error_type=type(e).__name__)
+                    finally:
+                        await self.release(chat_id)
+
+            await asyncio.gather(*(one(chat_id) for chat_id in list(self.held)))
+            log.info("catch_up_done", bot=self.name, stage="catch_up", latency=round(time.monotonic() - started, 3),
+                     scanned=self.scanned, numbered=self.numbered, outcome="ok")
+        finally:
+            for chat_id in list(self.held):
+                await self.release(chat_id)
+
+    async def release(self, chat_id):
+        held = sorted(self.held.pop(chat_id, []), key=lambda m: m.id)
+        if self.stopping:
+            return
+        for message in held:
+            await self.media.handle(message)
+
+    # --------------------------------------------------------------------------
+    # One chat
+    # --------------------------------------------------------------------------
+    async def fetch(self, chat_id, first_id: int, last_id: int) -> list:
+        ids = list(range(first_id, last_id + 1))
+        messages = await self.media.scheduler.call(chat_id, self.client.get_messages, chat_id, ids)
+        return [m for m in messages if not m.empty]
+
+    def limit(self, chat_id):
+        """Last id to scan: just before the first held live message, if any."""
+        held = self.held[chat_id]
+        return min(m.id for m in held) - 1 if held else None
+
+    def batch_end(self, chat_id, first_id: int) -> int:
+        end = first_id + self.batch_size - 1
+        limit = self.limit(chat_id)
+        return end if limit is None else min(end, limit)
+
+    async def chat(self, chat_id, started: float):
+        next_id = self.media.counters.last_handled(chat_id) + 1
+        end = self.batch_end(chat_id, next_id)
+        pending = asyncio.ensure_future(self.fetch(chat_id, next_id, end)) if end >= next_id else None
+        try:
+            while pending is not None:
+                messages = await pending
+                next_id = end + 1
+                limit = self.limit(chat_id)
+                if messages or (limit is not None and next_id <= limit):
+                    end = self.batch_end(chat_id, next_id)
+                    pending = asyncio.ensure_future(self.fetch(chat_id, next_id, end)) if end >= next_id else None
+                else:
+                    pending = None
+
+                self.scanned += len(messages)
+                self.numbered += await self.media.catch_up(chat_id, messages)
+                if messages:
+                    elapsed = time.monotonic() - started
+                    rate = self.numbered / elapsed if elapsed else 0.0
+                    log.info("catch_up_progress", bot=self.name, chat_id=chat_id, message_id=next_id - 1,
+                             numbered=self.numbered, elapsed=round(elapsed, 1), rate=round(rate, 1))
+                if self.stopping:
+                    break
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    # --------------------------------------------------------------------------
+    # Edits left unfinished by the last shutdown
+    # --------------------------------------------------------------------------
+    def _load_unfinished(self) -> dict:
+        if self.unfinished_path is None:
+            return {}
+        try:
+            with open(self.unfinished_path) as f:
+                edits = json.load(f)
+        except OSError:
+            return {}
+        except ValueError:
+            log.warning("unfinished_invalid", bot=self.name, path=self.unfinished_path)
+            return {}
+        return {(chat_id, message_id): caption for chat_id, message_id, caption in edits}
+
+    def _clear_unfinished(self):
+        try:
+            os.remove(self.unfinished_path)
+        except OSError:
+            pass
+
+    def save_unfinished(self):
+        """Record the edits MediaHandler (and resume()) did not finish."""
+        if self.unfinished_path is None:
+            return
+        edits = {**self.unfinished, **self.media.unfinished}
+        if not edits:
+            self._clear_unfinished()
+            return
+        tmp_path = self.unfinished_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([[chat_id, message_id, caption] for (chat_id, message_id), caption in edits.items()], f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.unfinished_path)
+        log.warning("unfinished_saved", bot=self.name, edits=len(edits), path=self.unfinished_path)
+
+    async def resume(self):
+        log.info("unfinished_resumed", bot=self.name, edits=len(self.unfinished))
+        by_chat = {}
+        for chat_id, message_id in sorted(self.unfinished):
+            by_chat.setdefault(chat_id, []).append(message_id)
+        for chat_id, ids in by_chat.items():
+            for i in range(0, len(ids), self.batch_size):
+                try:
+                    messages = await self.media.scheduler.call(chat_id, self.client.get_messages,
+                                                               chat_id, ids[i:i + self.batch_size])
+                except Exception as e:
+                    log.error("catch_up_failed", bot=self.name, chat_id=chat_id, stage="resume", outcome="kept",
+                              edits=len(ids) - i, error=str(e), error_type=type(e).__name__)
+                    break
+                edits = []
+                for message_id, message in zip(ids[i:i + self.batch_size], messages):
+                    caption = self.unfinished.pop((chat_id, message_id))
+                    if not message.empty:
+                        edits.append((message_id, self.media.track_edit(message, caption)))
+                results = await asyncio.gather(*(edit for _, edit in edits), return_exceptions=True)
+                for (message_id, _), result in zip(edits, results):
+                    if isinstance(result, Exception):
+                        log.error("edit_failed", bot=self.name, chat_id=chat_id, message_id=message_id,
+                                  stage="resume", outcome="error", error=str(result),
+                                  error_type=type(result).__name__)
+        if self.unfinished:
+            self.save_unfinished()
+        else:
+            self._clear_unfinished()
+
+def catchup_metrics(bots: list) -> list:
+    """Collector for health.HealthServer: chats each bot still has to catch up."""
+    return metric("bot_catchup_chats", "gauge", "Chats still catching up on missed messages",
+                  [({"bot": b.profile.name}, len(b.catchup.held)) for b in bots])
@@ -0,0 +1,170 @@
+import json
+import os
+import re
+import time
+
+from jsonlog import log
+from rules import nth_span
+
+# ------------------------------------------------------------------------------
+# Caption-format classifier: lets one bot serve channels that use different
+# caption formats (bots.toml `format = "auto"`).
+#
+# Every rule in rules.toml may declare a `signature` ("Class Date »",
+# "Title: ... ||", ".mkv", ...). All signatures are compiled into one generated
+# function that lowercases the caption once and checks them in rules-file
+# order, returning at the first match; when none matches, `default` is used.
+#
+# Literal markers are checked with str.find / `in`, which scan at memchr speed.
+# A single regex alternation over all signatures looks like the natural "one
+# pass", but CPython's re engine tries every branch at every position and was
+# 10-30x slower on 1 KB captions (python bench.py classify), so regex markers
+# are only used where a literal cannot express the signature ("//" but not
+# "://", written with the literal first so re can prefix-scan for it). The
+# cost is bounded by (number of signatures) x (caption length), and Telegram
+# captions are at most 4096 characters.
+#
+# update() swaps in recompiled rules when the rules file changes (host.py).
+#
+# Per-chat overrides (/format) pin a chat to one format and skip the scan.
+# They are kept in a small JSON file next to the bot's counter file.
+#
+# Each choice is recorded in Metrics (per-format counts, and the scan time as
+# the "classify" stage), and the last format used in each chat is kept for
+# /format.
+# ------------------------------------------------------------------------------
+AUTO = "auto"
+
+class FormatClassifier:
+    def __init__(self, rules: dict, default: str, overrides_path: str = None, metrics=None):
+        if default not in rules:
+            raise ValueError(f"❌ Unknown default format {default!r} (known: {', '.join(sorted(rules))})")
+        self.default = default
+        self.metrics = metrics
+        self.overrides_path = overrides_path
+        self.overrides = {}
+        self.update(rules)
+        self.overrides = self._load_overrides()
+        self.last = {}
+
+    def update(self, rules: dict):
+        """Switch to a new set of compiled rules in one step (rules hot reload).
+        Overrides pinned to a format that no longer exists are dropped."""
+        if self.default not in rules:
+            raise ValueError(f"❌ Unknown default format {self.default!r} (known: {', '.join(sorted(rules))})")
+        formats = [name for name, rule in rules.items() if rule.signature]
+        source, classify = self._compile([(name, rules[name].signature) for name in formats])
+        self.renders = {name: rule.cached_render for name, rule in rules.items()}
+        self.formats, self.source, self.classify = formats, source, classify
+        dropped = [chat_id for chat_id, name in self.overrides.items() if name not in self.renders]
+        for chat_id in dropped:
+            log.warning("format_override_dropped", chat_id=chat_id, format=self.overrides.pop(chat_id))
+        if dropped:
+            self._save_overrides()
+
+    @staticmethod
+    def _compile(signatures: list):
+        """Generate classify(caption) -> format name or None for [(name, markers), ...]."""
+        constants = {"nth_span": nth_span}
+
+        def const(value):
+            name = f"c{len(constants)}"
+            constants[name] = value
+            return name
+
+        lines = ["def classify(caption):"]
+        if any(marker.get("ignore_case") for _, markers in signatures for marker in markers):
+            lines.append("    lower = caption.lower()")
+        hits = 0
+        for name, markers in signatures:
+            tests = []
+            start = None
+            for marker in markers:
+                hits += 1
+                hit = f"v{hits}"
+                if "find" in marker:
+                    needle, haystack = marker["find"], "caption"
+                    if marker.get("ignore_case"):
+                        needle, haystack = needle.lower(), "lower"
+                    if start is None and marker is markers[-1]:
+                        tests.append(f"{const(needle)} in {haystack}")
+                        continue
+                    search = f"{haystack}.find({const(needle)}, {start or 0})"
+                    tests.append(f"({hit} := {search}) != -1")
+                    start = f"{hit} + {len(needle)}"
+                else:
+                    pattern = const(re.compile(marker["regex"]))
+                    if start is None and marker is markers[-1] and marker.get("nth", 1) == 1:
+                        tests.append(f"{pattern}.search(caption)")
+                        continue
+                    tests.append(f"({hit} := nth_span({pattern}, caption, {int(marker.get('nth', 1))}, {start or 0})) is not None")
+                    start = f"{hit}[1]"
+            lines.append(f"    if {' and '.join(tests)}:")
+            lines.append(f"        return {const(name)}")
+        lines.append("    return None")
+
+        source = "\n".join(lines) + "\n"
+        exec(compile(source, "<classifier>", "exec"), constants)
+        return source, constants["classify"]
+
+    def choose(self, chat_id, caption: str) -> str:
+        name = self.overrides.get(chat_id)
+        if name is None:
+            start = time.perf_counter()
+            name = self.classify(caption) or self.default
+            if self.metrics is not None:
+                self.metrics.observe("classify", time.perf_counter() - start)
+        if self.metrics is not None:
+            self.metrics.record_format(name)
+        self.last[chat_id] = name
+        return name
+
+    def render(self, caption: str, num: int) -> str:
+        """render(caption, num) for callers without a chat: classification only."""
+        return self.renders[self.classify(caption) or self.default](caption, num)
+
+    def for_chat(self, chat_id):
+        """render(caption, num) for one chat, honouring its override."""
+        def render(caption: str, num: int) -> str:
+            return self.renders[self.choose(chat_id, caption)](caption, num)
+        return render
+
+    # --------------------------------------------------------------------------
+    # Overrides
+    # --------------------------------------------------------------------------
+    def set_override(self, chat_id, name: str):
+        """Pin chat_id to format `name`, or go back to classification with "auto"."""
+        if name == AUTO:
+            self.overrides.pop(chat_id, None)
+        elif name in self.renders:
+            self.overrides[chat_id] = name
+        else:
+            raise ValueError(f"Unknown caption format {name!r}")
+        self._save_overrides()
+
+    def _load_overrides(self) -> dict:
+        if self.overrides_path is None:
+            return {}
+        try:
+            with open(self.overrides_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning("format_overrides_invalid", path=self.overrides_path, error=str(e), error_type=type(e).__name__)
+            return {}
+        overrides = {}
+        for chat_id, name in data.items():
+            if name in self.renders:
+                overrides[int(chat_id)] = name
+            else:
+                log.warning("format_override_dropped", chat_id=chat_id, format=name)
+        return overrides
+
+    def _save_overrides(self):
+        if self.overrides_path is None:
+            return
+        tmp_path = self.overrides_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(chat_id): name for chat_id, name in self.overrides.items()}, f)
+        os.replace(tmp_path, self.overrides_path)
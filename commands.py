@@ -0,0 +1,141 @@
+import html
+
+from pyrogram import enums
+
+from renumber import is_admin, renumber_command
+from styling import format_number
+
+# ------------------------------------------------------------------------------
+# Chat commands shared by every bot.
+#
+#   /start                               format-specific instructions
+#   /reset                               restart numbering at {001} in this chat
+#   /set <number>                        continue numbering from <number>
+#   /renumber <from> <to> [start]        renumber existing posts (admins only)
+#   /stats                               stage latencies and rates (admins only)
+#   /format [name|auto]                  show or pin this chat's caption format
+#                                        (format = "auto" bots, admins only)
+#
+# Replies go through the bot's EditScheduler, so they share the rate limits
+# with caption edits.
+# ------------------------------------------------------------------------------
+START_TEXTS = {
+    "class_date": (
+        "<b>Welcome!</b>\n"
+        "This bot automatically numbers video file captions and processes text starting from the keyword \"Class Date »\". "
+        "If the caption contains \"Class Date »\", the text from that point is forced onto one line, converted into non‑bold, non‑italic Mathematical Sans‑Serif Plain style, and prepended with a numbering prefix (in square brackets) wrapped in a blockquote. "
+        "Any text before \"Class Date »\" is appended below the blockquote. "
+        "Additionally, if the text \"31 October 2024\" appears after the marker, it will be removed. "
+        "If \"Class Date »\" is not found, only the numbering is blockquoted and converted, while the rest of the caption remains unchanged. "
+        "For PDF files, the caption is removed entirely.\n\n"
+        "<b>Commands:</b>\n"
+        "• <code>/reset</code> - Reset numbering to " + format_number(1) + "\n"
+        "• <code>/set &lt;number&gt;</code> - Set numbering starting from a custom number (e.g. <code>/set 051</code>)\n"
+        "• <code>/renumber &lt;from_msg_id&gt; &lt;to_msg_id&gt; [start]</code> - Renumber existing posts in this chat\n"
+        "• <code>/stats</code> - Processing latency and throughput (admins only)\n"
+        "• Send a video file with a caption containing \"Class Date »\" to see the processing in action."
+    ),
+    "title": (
+        "<b>Welcome!</b>\n"
+        "This bot processes captions with the following structure:\n"
+        "• The caption contains a 'Title:' line. After 'Title:', there is a closing parenthesis \")\".\n"
+        "• Following the \")\", the text up to the delimiter '||' is extracted, cleaned (removing non-alphabet characters and the phrases 'ATM Batch' and 'Atm Maths'), and used for blockquoting with numbering.\n"
+        "• The text from after '||' up to the marker '➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³' is appended as plain text.\n"
+        "Send a video file with a caption in this format to see the processing in action."
+    ),
+    "indian_geography": (
+        "<b>Welcome to the Indian Geography Caption Bot!</b>\n"
+        "This bot processes captions that follow this format:\n\n"
+        "   ... Indian Geography- <i>your content here</i> ➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³ ...\n\n"
+        "It extracts the text between the dash (-) after 'Indian Geography' and the marker '➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³',\n"
+        "and uses 'Indian Geography' (with sequential numbering) in a blockquote, while appending the extracted content as plain text.\n\n"
+        "For example, a caption like:\n"
+        "   Indian Geography- Details about India’s rivers and mountains. ➸ᴹᴿ°ℂr‌𝕒c‌k‌єr࿐⁰³\n\n"
+        "will be converted to:\n"
+        "   <blockquote>[001] Indian Geography</blockquote>\n"
+        "   Details about India’s rivers and mountains.\n\n"
+        "Send a video file with a caption in this format to see the processing in action."
+    ),
+    "reas": "Send media with captions for processing",
+    "slash": (
+        "📚 <b>Caption Formatter Bot</b>\n\n"
+        "Send videos with captions formatted as:\n"
+        "<code>Title text // Additional details Batch info</code>\n\n"
+        "• Text before // becomes numbered title\n"
+        "• Everything after Batch is removed\n"
+        "• Automatic sans-serif formatting applied"
+    ),
+    "mkv": "Welcome! Use /reset to reset numbering or /set &lt;number&gt; to set a custom start.",
+    "auto": (
+        "<b>Welcome!</b>\n"
+        "This bot numbers video captions and recognises their format automatically "
+        "(\"Class Date »\", \"Title: … ||\", \"Indian Geography-\", \"ᒪᑭᖇᑭᗪᐯ\", \".mkv\", \"//\"). "
+        "Captions in no known format are only numbered. PDF captions are removed.\n\n"
+        "<b>Commands:</b>\n"
+        "• <code>/reset</code> - Reset numbering to " + format_number(1) + "\n"
+        "• <code>/set &lt;number&gt;</code> - Set numbering starting from a custom number\n"
+        "• <code>/format &lt;name&gt;</code> - Always use one format in this chat; <code>/format auto</code> to detect again (admins only)\n"
+        "• <code>/renumber &lt;from_msg_id&gt; &lt;to_msg_id&gt; [start]</code> - Renumber existing posts in this chat\n"
+        "• <code>/stats</code> - Processing latency and throughput (admins only)"
+    ),
+}
+
+SET_USAGE = "❌ <b>Usage:</b> <code>/set &lt;number&gt;</code>\nExample: <code>/set 051</code>"
+
+class Commands:
+    def __init__(self, media, start_text: str):
+        self.media = media
+        self.counters = media.counters
+        self.scheduler = media.scheduler
+        self.start_text = start_text
+
+    async def start(self, client, message):
+        await self.scheduler.reply(message, self.start_text, parse_mode=enums.ParseMode.HTML)
+
+    async def reset(self, client, message):
+        await self.counters.set(message.chat.id, 1)
+        await self.scheduler.reply(message, "✅ Numbering has been reset to " + format_number(1),
+                                   parse_mode=enums.ParseMode.HTML)
+
+    async def set_number(self, client, message):
+        try:
+            new_number = int(message.command[1])
+            if new_number < 1:
+                raise ValueError
+        except (IndexError, ValueError):
+            await self.scheduler.reply(message, SET_USAGE, parse_mode=enums.ParseMode.HTML)
+            return
+        await self.counters.set(message.chat.id, new_number)
+        await self.scheduler.reply(message, "✅ Numbering set to " + format_number(new_number),
+                                   parse_mode=enums.ParseMode.HTML)
+
+    async def renumber(self, client, message):
+        await renumber_command(client, message, self.media)
+
+    async def stats(self, client, message):
+        if not await is_admin(client, message):
+            await self.scheduler.reply(message, "❌ Only chat admins can view stats.")
+            return
+        text = (self.scheduler.metrics.summary()
+                + f"\nqueued calls: {self.scheduler.depth}, FloodWaits: {self.scheduler.flood_waits}")
+        await self.scheduler.reply(message, f"<pre>{html.escape(text)}</pre>", parse_mode=enums.ParseMode.HTML)
+
+    async def set_format(self, client, message):
+        classifier = self.media.classifier
+        if classifier is None:
+            await self.scheduler.reply(message, "❌ This bot uses a fixed caption format.")
+            return
+        if not await is_admin(client, message):
+            await self.scheduler.reply(message, "❌ Only chat admins can change the caption format.")
+            return
+        chat_id = message.chat.id
+        known = ", ".join(sorted(classifier.renders))
+        if len(message.command) > 1:
+            try:
+                classifier.set_override(chat_id, message.command[1])
+            except ValueError:
+                await self.scheduler.reply(message, f"❌ Unknown format. Known: {known}, auto")
+                return
+        current = classifier.overrides.get(chat_id, "auto")
+        last = classifier.last.get(chat_id, "none yet")
+        await self.scheduler.reply(message, f"Caption format: {current} (last used: {last})\nKnown: {known}, auto")
@@ -0,0 +1,317 @@
+import asyncio
+import atexit
+import itertools
+import os
+import queue
+import threading
+import time
+import zlib
+
+from jsonlog import log
+from metrics import Metrics
+
+# ------------------------------------------------------------------------------
+# Crash-safe counter store backed by an append-only journal.
+#
+# Every update is one journal line "key<TAB>value<TAB>crc32\n". The value is
+# updated in memory immediately and the line is handed to a background writer
+# thread, so callers (usually holding an asyncio.Lock on the event loop) never
+# touch the disk themselves.
+#
+# Durability:
+#   - lines reach the OS as soon as the writer picks them up, so a process crash
+#     loses nothing that was already queued;
+#   - fsync is batched: at most once per durability_window seconds, which bounds
+#     what a power loss can take back.
+#
+# Recovery replays the journal (last value per key wins) and stops at the first
+# torn or corrupt line instead of silently resetting to a default. Every
+# compact_every lines, and once more on close(), the journal is rewritten as a
+# snapshot of the current values (temp file + fsync + os.replace), so the file
+# never grows unbounded.
+#
+# The old single-number text file (e.g. numbering_state.txt) is read once as a
+# seed when no journal exists yet.
+#
+# A write error (disk full, I/O error) is logged as journal_write_failed,
+# counted in write_errors and flags the store as `failing` (reported by the
+# health endpoint); the writer keeps running. As a failed append may have left
+# a torn line, it then retries, with a growing delay, to write a snapshot of
+# the current values, which replaces the journal and covers everything queued
+# in the meantime, and goes back to appending once that succeeds.
+# ------------------------------------------------------------------------------
+RETRY_DELAYS = (1.0, 2.0, 5.0, 10.0, 30.0)
+
+class CounterStore:
+    def __init__(self, path: str, durability_window: float = 0.5, compact_every: int = 1000):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        self.durability_window = durability_window
+        self.compact_every = compact_every
+
+        self._values = {}
+        self._queue = queue.Queue()
+        self._closed = False
+        self.write_errors = 0
+        self.failing = False
+        self._recover()
+
+        self._writer = threading.Thread(target=self._run_writer, name="counter-journal", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # --------------------------------------------------------------------------
+    # Public API (called from the event loop; in-memory work only)
+    # --------------------------------------------------------------------------
+    def get(self, key: str, default: int = 1) -> int:
+        return self._values.get(key, default)
+
+    def keys(self) -> list:
+        return list(self._values)
+
+    def set(self, key: str, value: int):
+        self._values[key] = value
+        self._queue.put((key, value))
+
+    def close(self):
+        """Stop the writer and compact the journal into a fsynced snapshot."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        try:
+            self._write_snapshot()
+        except OSError as e:
+            self._write_failed(e, "close", outcome="error")
+
+    # --------------------------------------------------------------------------
+    # Recovery
+    # --------------------------------------------------------------------------
+    def _recover(self):
+        if not os.path.exists(self.journal_path):
+            seed = self._read_legacy()
+            if seed is not None:
+                self._values["current_number"] = seed
+            self._write_snapshot()
+            return
+
+        valid_bytes = 0
+        with open(self.journal_path, "rb") as f:
+            for raw in f:
+                record = self._parse(raw)
+                if record is None:
+                    break
+                key, value = record
+                self._values[key] = value
+                valid_bytes += len(raw)
+
+        if os.path.getsize(self.journal_path) != valid_bytes:
+            log.warning("journal_torn_tail", path=self.journal_path, valid_bytes=valid_bytes)
+            self._write_snapshot()
+
+    def _read_legacy(self):
+        try:
+            with open(self.path, "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _encode(key: str, value: int) -> bytes:
+        body = f"{key}\t{value}".encode()
+        return body + b"\t" + format(zlib.crc32(body), "08x").encode() + b"\n"
+
+    @staticmethod
+    def _parse(raw: bytes):
+        if not raw.endswith(b"\n"):
+            return None
+        body, sep, crc = raw[:-1].rpartition(b"\t")
+        if not sep or format(zlib.crc32(body), "08x").encode() != crc:
+            return None
+        key, sep, value = body.decode().partition("\t")
+        try:
+            return key, int(value)
+        except ValueError:
+            return None
+
+    # --------------------------------------------------------------------------
+    # Writer thread
+    # --------------------------------------------------------------------------
+    def _write_snapshot(self):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for key, value in list(self._values.items()):
+                f.write(self._encode(key, value))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._sync_dir()
+
+    def _sync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.journal_path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _write_failed(self, error: OSError, stage: str, **fields):
+        self.write_errors += 1
+        self.failing = True
+        log.error("journal_write_failed", path=self.journal_path, stage=stage, error=str(error),
+                  error_type=type(error).__name__, **fields)
+
+    def _run_writer(self):
+        while True:
+            try:
+                self._append()
+                return
+            except OSError as e:
+                self._write_failed(e, "append", outcome="retry")
+            if not self._rewrite_journal():
+                return
+
+    def _rewrite_journal(self) -> bool:
+        """After a write error, retry until a snapshot replaces the journal;
+        False if the store was closed meanwhile."""
+        for attempt in itertools.count(1):
+            if not self._wait(RETRY_DELAYS[min(attempt, len(RETRY_DELAYS)) - 1]):
+                return False
+            try:
+                self._write_snapshot()
+            except OSError as e:
+                self._write_failed(e, "snapshot", outcome="retry", attempt=attempt)
+                continue
+            self.failing = False
+            log.info("journal_recovered", path=self.journal_path, attempts=attempt)
+            return True
+
+    def _wait(self, seconds: float) -> bool:
+        """Sleep, dropping queued updates (the next snapshot has their values);
+        False if close() was called."""
+        deadline = time.monotonic() + seconds
+        while (left := deadline - time.monotonic()) > 0:
+            try:
+                if self._queue.get(timeout=left) is None:
+                    return False
+            except queue.Empty:
+                break
+        return True
+
+    def _append(self):
+        """Append queued updates, compacting every compact_every lines, until close()."""
+        while True:
+            journal = open(self.journal_path, "ab")
+            try:
+                closed = self._append_to(journal)
+            finally:
+                journal.close()
+            if closed:
+                return
+            self._write_snapshot()
+
+    def _append_to(self, journal) -> bool:
+        """Append to journal until close() (True) or until it is due for compaction."""
+        since_compact = 0
+        dirty = False
+        last_sync = time.monotonic()
+
+        def sync():
+            nonlocal dirty, last_sync
+            if dirty:
+                journal.flush()
+                os.fsync(journal.fileno())
+                dirty = False
+            last_sync = time.monotonic()
+
+        while True:
+            timeout = None
+            if dirty:
+                timeout = max(0.0, last_sync + self.durability_window - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                sync()
+                continue
+
+            if item is None:
+                sync()
+                return True
+
+            journal.write(self._encode(*item))
+            journal.flush()
+            dirty = True
+            since_compact += 1
+
+            if since_compact >= self.compact_every:
+                sync()
+                return False
+            if time.monotonic() - last_sync >= self.durability_window:
+                sync()
+
+# ------------------------------------------------------------------------------
+# Per-chat counters with one asyncio.Lock per chat.
+#
+# Each chat_id gets its own journal key ("chat:<id>") and its own lock, so a
+# burst in one channel never waits on another channel's counter. Chats that
+# have no entry yet start from the legacy single "current_number" value, which
+# keeps an existing single-channel deployment numbering where it left off.
+# Lock wait and counter update times go to the bot's Metrics.
+#
+# The highest message id handled in each chat is journaled next to its counter
+# ("last:<id>"), so that catch-up (catchup.py) knows where to resume after a
+# restart.
+# ------------------------------------------------------------------------------
+class ChatCounters:
+    def __init__(self, store: CounterStore, metrics: Metrics = None):
+        self.store = store
+        self.metrics = metrics or Metrics()
+        self.default = store.get("current_number", 1)
+        self._locks = {}
+
+    @staticmethod
+    def key(chat_id) -> str:
+        return f"chat:{chat_id}"
+
+    def lock(self, chat_id) -> asyncio.Lock:
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        return lock
+
+    def get(self, chat_id) -> int:
+        return self.store.get(self.key(chat_id), self.default)
+
+    async def reserve(self, chat_id, count: int = 1) -> int:
+        """Reserve count consecutive numbers for chat_id and return the first one."""
+        lock = self.lock(chat_id)
+        with self.metrics.time("lock_wait"):
+            await lock.acquire()
+        try:
+            with self.metrics.time("reserve"):
+                first = self.get(chat_id)
+                self.store.set(self.key(chat_id), first + count)
+        finally:
+            lock.release()
+        return first
+
+    async def set(self, chat_id, value: int):
+        async with self.lock(chat_id):
+            self.store.set(self.key(chat_id), value)
+
+    def last_handled(self, chat_id):
+        return self.store.get(f"last:{chat_id}", None)
+
+    def mark_handled(self, chat_id, message_id: int):
+        """Record message_id as handled unless a later one already is."""
+        last = self.last_handled(chat_id)
+        if last is None or message_id > last:
+            self.store.set(f"last:{chat_id}", message_id)
+
+    def handled_chats(self) -> list:
+        return [int(key[5:]) for key in self.store.keys() if key.startswith("last:")]
@@ -0,0 +1,224 @@
+import atexit
+import hashlib
+import itertools
+import mmap
+import os
+import queue
+import struct
+import threading
+
+from counter_store import RETRY_DELAYS
+from jsonlog import log
+
+# ------------------------------------------------------------------------------
+# On-disk index of already numbered videos: (chat_id, file_unique_id) ->
+# (number, rendered caption).
+#
+# Source channels re-post the same lecture; with the index a re-upload can get
+# its original number and caption back without touching the counter or the
+# caption rules (see MediaHandler's duplicate policy).
+#
+# Layout, for millions of entries with constant-time lookups:
+#   <base>.fidx   open-addressing hash table, memory-mapped. Each 40-byte slot
+#                 holds a 16-byte BLAKE2b digest of the key, the number, and
+#                 the offset/length of the caption. Linear probing; the table
+#                 doubles (rewritten to a temp file, then os.replace) when it
+#                 is more than max_load full.
+#   <base>.fcap   append-only UTF-8 captions referenced by the slots.
+#
+# put() runs on the event loop, so like the counter journal it only records the
+# entry in memory (`_pending`, which get() checks first) and queues it for a
+# background writer thread. The writer appends the caption, flushes it, and only
+# then writes the slot, so a crash never leaves a slot pointing at missing
+# bytes. Doubling the table is done by the writer as well: the new table is
+# built and fsynced from a copy of the old one while get() keeps reading the
+# old map, and the maps are swapped under a lock held for microseconds.
+# Nothing is fsynced per entry; close() drains the queue and flushes the map.
+#
+# initial_capacity sizes a new table (bots.toml: file_index_capacity), so an
+# index expected to grow large can skip the early doublings.
+#
+# A write error (disk full, I/O error) is logged as file_index_write_failed,
+# counted in write_errors and flags the index as `failing` (reported by the
+# health endpoint). The writer retries the same entry with a growing delay and
+# keeps the rest queued (get() still finds them in `_pending`); an entry still
+# failing when close() is called is dropped with file_index_entry_dropped.
+# ------------------------------------------------------------------------------
+MAGIC = b"FIDX"
+HEADER = struct.Struct("<4sIQQ")
+HEADER_SIZE = 32
+SLOT = struct.Struct("<16sqQI4x")
+EMPTY = bytes(16)
+
+class FileIndex:
+    def __init__(self, base: str, initial_capacity: int = 1 << 16, max_load: float = 0.7):
+        if initial_capacity < 1 or initial_capacity & (initial_capacity - 1):
+            raise ValueError("initial_capacity must be a power of two")
+        self.index_path = base + ".fidx"
+        self.captions_path = base + ".fcap"
+        self.max_load = max_load
+        self._captions = open(self.captions_path, "a+b")
+        self._file = None
+        self._mm = None
+        self._closed = False
+        self._stopping = threading.Event()
+        self.write_errors = 0
+        self.failing = False
+        self._pending = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        if not os.path.exists(self.index_path):
+            self._create(self.index_path, initial_capacity)
+        self._map()
+        self._writer = threading.Thread(target=self._run_writer, name="file-index", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def digest(chat_id: int, file_unique_id: str) -> bytes:
+        return hashlib.blake2b(f"{chat_id}:{file_unique_id}".encode(), digest_size=16).digest()
+
+    def __len__(self) -> int:
+        return self.count + len(self._pending)
+
+    # --------------------------------------------------------------------------
+    # Lookups and inserts
+    # --------------------------------------------------------------------------
+    def _find(self, digest: bytes):
+        """Return (slot offset, found) for digest: its slot, or the empty slot it would take."""
+        mask = self.capacity - 1
+        i = int.from_bytes(digest[:8], "little") & mask
+        while True:
+            offset = HEADER_SIZE + i * SLOT.size
+            stored = self._mm[offset:offset + 16]
+            if stored == digest:
+                return offset, True
+            if stored == EMPTY:
+                return offset, False
+            i = (i + 1) & mask
+
+    def get(self, chat_id: int, file_unique_id: str):
+        """Return (number, caption) for a known file, else None."""
+        digest = self.digest(chat_id, file_unique_id)
+        entry = self._pending.get(digest)
+        if entry is not None:
+            return entry
+        with self._lock:
+            offset, found = self._find(digest)
+            if not found:
+                return None
+            _, number, caption_offset, caption_length = SLOT.unpack_from(self._mm, offset)
+        return number, os.pread(self._captions.fileno(), caption_length, caption_offset).decode()
+
+    def put(self, chat_id: int, file_unique_id: str, number: int, caption: str):
+        digest = self.digest(chat_id, file_unique_id)
+        entry = (number, caption)
+        with self._lock:
+            self._pending[digest] = entry
+        self._queue.put((digest, entry))
+
+    def close(self):
+        """Write what is queued, stop the writer and flush the map."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stopping.set()
+        self._queue.put(None)
+        self._writer.join()
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+        self._captions.close()
+
+    # --------------------------------------------------------------------------
+    # Writer thread
+    # --------------------------------------------------------------------------
+    def _run_writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._write_retrying(*item)
+
+    def _write_retrying(self, digest: bytes, entry: tuple):
+        """_write the entry, retrying on OSError until it succeeds or close() is called."""
+        for attempt in itertools.count(1):
+            try:
+                self._write(digest, entry)
+            except OSError as e:
+                self.write_errors += 1
+                self.failing = True
+                log.error("file_index_write_failed", path=self.index_path, error=str(e),
+                          error_type=type(e).__name__, attempt=attempt)
+            else:
+                if self.failing:
+                    self.failing = False
+                    log.info("file_index_recovered", path=self.index_path, attempts=attempt)
+                return
+            if self._stopping.wait(RETRY_DELAYS[min(attempt, len(RETRY_DELAYS)) - 1]):
+                log.error("file_index_entry_dropped", path=self.index_path, number=entry[0])
+                return
+
+    def _write(self, digest: bytes, entry: tuple):
+        number, caption = entry
+        data = caption.encode()
+        self._captions.seek(0, os.SEEK_END)
+        caption_offset = self._captions.tell()
+        self._captions.write(data)
+        self._captions.flush()
+
+        with self._lock:
+            offset, found = self._find(digest)
+            SLOT.pack_into(self._mm, offset, digest, number, caption_offset, len(data))
+            if not found:
+                self.count += 1
+                HEADER.pack_into(self._mm, 0, MAGIC, 1, self.capacity, self.count)
+            if self._pending.get(digest) is entry:
+                del self._pending[digest]
+        if self.count > self.capacity * self.max_load:
+            self._grow()
+
+    # --------------------------------------------------------------------------
+    # Table files
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _create(path: str, capacity: int, slots=()):
+        """Write a table of `capacity` slots holding the given raw slot records."""
+        table = bytearray(HEADER_SIZE + capacity * SLOT.size)
+        mask = capacity - 1
+        count = 0
+        for record in slots:
+            i = int.from_bytes(record[:8], "little") & mask
+            while table[HEADER_SIZE + i * SLOT.size:HEADER_SIZE + i * SLOT.size + 16] != EMPTY:
+                i = (i + 1) & mask
+            table[HEADER_SIZE + i * SLOT.size:HEADER_SIZE + (i + 1) * SLOT.size] = record
+            count += 1
+        HEADER.pack_into(table, 0, MAGIC, 1, capacity, count)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(table)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _map(self):
+        self._file = open(self.index_path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, _, self.capacity, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or len(self._mm) != HEADER_SIZE + self.capacity * SLOT.size:
+            raise ValueError(f"❌ {self.index_path} is not a valid file index")
+
+    def _grow(self):
+        """Double the table (writer thread; only the final swap takes the lock)."""
+        table = bytes(self._mm)
+        slots = [
+            table[offset:offset + SLOT.size]
+            for offset in range(HEADER_SIZE, len(table), SLOT.size)
+            if table[offset:offset + 16] != EMPTY
+        ]
+        self._create(self.index_path, self.capacity * 2, slots)
+        with self._lock:
+            self._mm.close()
+            self._file.close()
+            self._map()
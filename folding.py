@@ -0,0 +1,190 @@
+import re
+import unicodedata
+from bisect import bisect_right
+
+# ------------------------------------------------------------------------------
+# Canonical folding for marker matching, tolerant of styling changes.
+#
+# Uploaders restyle their watermarks: "sachin" becomes "𝐒𝐀𝐂𝐇𝐈𝐍" or "ꜱᴀᴄʜ𝖎𝖓",
+# zero-width non-joiners appear inside "ℂr𝕒ckєr". Exact str.find misses all of
+# these. fold() maps every character to a canonical form:
+#   - format characters (zero-width space / joiners, word joiner, BOM, soft
+#     hyphen, bidi marks) and variation selectors are removed;
+#   - small capitals (ᴀ ʙ ᴄ ... ꜱ, which have no compatibility decomposition)
+#     become ASCII letters;
+#   - NFKC, then casefold: mathematical alphanumerics (𝐒, 𝕒, 𝖎), letterlike
+#     symbols (ℂ), modifier letters (ᴹᴿ) and super/subscript digits (⁰³)
+#     become plain letters and digits, and case is ignored.
+# Folding is per character (no composition across characters), so markers and
+# captions fold the same way and every folded character comes from exactly
+# one original character.
+#
+# Folded(text) folds a caption once and maps positions in the folded text back
+# to the original, so a marker found in the folded text can be cut out of, or
+# sliced from, the original caption. The work stays in C: ASCII text is only
+# lowercased, and each run of other characters goes through one str.translate
+# with a table that normalises each distinct character once per process.
+# Non-ASCII characters that fold to their own lowercase ("»", "➵", emoji) are
+# remembered as stable and skipped like ASCII, so only styled runs are
+# translated. Nearly every character folds to exactly one character; the few that
+# do not (zero-width characters, ligatures) are remembered, and the offset map
+# is just their positions, found with one regex scan when a match needs it.
+#
+# find_folded() tries the marker's exact spelling first and only folds the
+# caption when that misses, so captions carrying the usual watermark pay
+# nothing extra; an exact occurrence wins over an earlier restyled one.
+# is_plain() tells, with one scan that stops at the first styled character,
+# whether folding a text would do more than lowercase it.
+# ------------------------------------------------------------------------------
+SMALL_CAPS = dict(zip("ᴀʙᴄᴅᴇꜰɢʜɪᴊᴋʟᴍɴᴏᴘꞯʀꜱᴛᴜᴠᴡʏᴢ", "abcdefghijklmnopqrstuvwyz"))
+
+def _fold_char(ch: str) -> str:
+    if unicodedata.category(ch) == "Cf" or "\ufe00" <= ch <= "\ufe0f":
+        return ""
+    ch = SMALL_CAPS.get(ch, ch)
+    return unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", ch).casefold())
+
+class _FoldTable(dict):
+    """str.translate table: code point -> folded string, filled on first use."""
+
+    def __init__(self):
+        super().__init__((i, chr(i)) for i in range(128))
+        self.irregular = set()
+        self.stable = set()
+        self._irregular_re = None
+        self._run_re = None
+        self._styled_re = None
+
+    def __missing__(self, code: int) -> str:
+        ch = chr(code)
+        folded = self[code] = _fold_char(ch)
+        if len(folded) != 1:
+            self.irregular.add(ch)
+            self._irregular_re = None
+        elif folded == ch.lower():
+            self.stable.add(ch)
+            self._run_re = None
+            self._styled_re = None
+        return folded
+
+    def run_re(self):
+        """Pattern matching runs of characters that need translating: anything but
+        ASCII and the stable characters seen so far, merged across short gaps so
+        that fully styled text is one run rather than one per word."""
+        if self._run_re is None:
+            skip = "\\x00-\\x7f" + "".join(map(re.escape, sorted(self.stable)))
+            # Possessive: giving gap characters back never lets a run continue,
+            # and it spares re a backtracking entry per repetition
+            self._run_re = re.compile(f"[^{skip}](?:[{skip}]{{0,8}}+[^{skip}])*+")
+        return self._run_re
+
+    def styled_re(self):
+        """Pattern matching one character that needs translating (see run_re)."""
+        if self._styled_re is None:
+            skip = "\\x00-\\x7f" + "".join(map(re.escape, sorted(self.stable)))
+            self._styled_re = re.compile(f"[^{skip}]")
+        return self._styled_re
+
+    def irregular_re(self):
+        """Pattern matching the characters seen so far that do not fold to one character."""
+        if self._irregular_re is None and self.irregular:
+            self._irregular_re = re.compile("[" + "".join(map(re.escape, sorted(self.irregular))) + "]")
+        return self._irregular_re
+
+FOLD = _FoldTable()
+
+def _fold_run(match) -> str:
+    return match.group().translate(FOLD)
+
+class Folded:
+    """A folded caption plus the mapping of folded positions back to the original."""
+
+    __slots__ = ("original", "text", "_positions", "_folded_starts", "_lengths")
+
+    def __init__(self, original: str):
+        self.original = original
+        if original.isascii():
+            self.text = original.lower()
+        else:
+            self.text = FOLD.run_re().sub(_fold_run, original).lower()
+        self._positions = None
+
+    def _offsets(self):
+        """Original positions, folded positions and folded lengths of the irregular characters."""
+        if self._positions is None:
+            self._positions, self._folded_starts, self._lengths = [], [], []
+            pattern = None if self.original.isascii() else FOLD.irregular_re()
+            if pattern is not None:
+                shift = 0
+                for match in pattern.finditer(self.original):
+                    length = len(FOLD[ord(match.group())])
+                    self._positions.append(match.start())
+                    self._folded_starts.append(match.start() + shift)
+                    self._lengths.append(length)
+                    shift += length - 1
+        return self._positions, self._folded_starts, self._lengths
+
+    def to_original(self, pos: int, end: bool = False) -> int:
+        """Original index of the character that produced folded character pos;
+        with end=True, pos is an exclusive end and so is the result."""
+        if end:
+            return self.to_original(pos - 1) + 1 if pos else 0
+        positions, folded_starts, lengths = self._offsets()
+        i = bisect_right(folded_starts, pos) - 1
+        if i < 0:
+            return pos
+        if pos < folded_starts[i] + lengths[i]:
+            return positions[i]
+        return positions[i] + 1 + pos - folded_starts[i] - lengths[i]
+
+    def to_folded(self, pos: int) -> int:
+        """Folded index of original index pos (a character boundary)."""
+        positions, folded_starts, lengths = self._offsets()
+        i = bisect_right(positions, pos - 1) - 1
+        if i < 0:
+            return pos
+        return folded_starts[i] + lengths[i] + pos - positions[i] - 1
+
+    def find(self, marker: str, start: int = 0):
+        """(start, end) in the original of the first occurrence of the folded
+        marker at or after original index start, or None."""
+        if not self._offsets()[0]:
+            pos = self.text.find(marker, start)
+            return None if pos == -1 else (pos, pos + len(marker))
+        pos = self.text.find(marker, self.to_folded(start) if start else 0)
+        if pos == -1:
+            return None
+        return self.to_original(pos), self.to_original(pos + len(marker), end=True)
+
+    def spans(self, pattern) -> list:
+        """Original (start, end) spans of the non-empty matches of pattern in the folded text."""
+        matches = [m.span() for m in pattern.finditer(self.text) if m.end() > m.start()]
+        if not matches or not self._offsets()[0]:
+            return matches
+        return [(self.to_original(start), self.to_original(end, end=True)) for start, end in matches]
+
+def find_folded(text: str, marker: str, folded_marker: str, start: int = 0):
+    """(start, end) of marker in text at or after start: the exact spelling if
+    present (no folding needed), else the first folded match, else None."""
+    pos = text.find(marker, start)
+    if pos != -1:
+        return pos, pos + len(marker)
+    return Folded(text).find(folded_marker, start)
+
+def is_plain(text: str) -> bool:
+    """True when folding text only lowercases it: no character needs translating."""
+    return text.isascii() or FOLD.styled_re().search(text) is None
+
+def fold(text: str) -> str:
+    """Canonical form of text for marker matching (see above)."""
+    return Folded(text).text
+
+def remove_spans(text: str, spans) -> str:
+    """text without the given ordered, non-overlapping (start, end) spans."""
+    parts = []
+    pos = 0
+    for start, end in spans:
+        parts.append(text[pos:start])
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
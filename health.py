@@ -0,0 +1,273 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import deque
+
+from jsonlog import log
+
+# ------------------------------------------------------------------------------
+# Health and metrics endpoint on the bots' own event loop.
+#
+#   GET /  or  /health    200 "OK", or 503 with the reasons the process is unwell
+#   GET /metrics          Prometheus text format
+#   GET /stalls           recent event-loop stalls with the stack that caused
+#                         them (StallWatchdog)
+#
+# Because the server is served by the same loop as the bots, a probe that gets
+# an answer at all proves the loop is turning. On top of that the process is
+# reported unhealthy when
+#   - the measured event-loop lag is above max_lag seconds, or
+#   - a bot has calls queued in its EditScheduler but no caption edit has
+#     succeeded for stall_after seconds (stuck connection, endless FloodWait).
+# An idle bot with nothing queued is healthy however long ago it last edited.
+#
+# Extra metric lines can be added by appending a callable returning a list of
+# lines to HealthServer.collectors, extra problems likewise to
+# HealthServer.checks.
+# ------------------------------------------------------------------------------
+class LoopLagMonitor:
+    """Sleep `interval` seconds in a loop and record how late each wake-up is."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+
+# ------------------------------------------------------------------------------
+# Stall watchdog: which code blocks the event loop.
+#
+# LoopLagMonitor only sees that a wake-up came late. StallWatchdog runs in its
+# own thread: every `interval` seconds it schedules a ping on the loop with
+# call_soon_threadsafe and waits for it. Every ping's delay goes into a
+# histogram. A ping still waiting after `slow_after` seconds means one step on
+# the loop (a handler, a callback, a file write) has been running that long,
+# so the watchdog captures the loop thread's stack right then, while the
+# culprit is still on it. Once the loop answers, the stall is recorded with its
+# full duration, logged (jsonlog, sampled) and kept among the last `keep`
+# stalls for /stalls and /metrics.
+#
+# Code that holds the GIL for the whole stall (one long C call, such as a
+# single regex match) keeps the watchdog from running until it returns; its
+# stack is then captured at the next step, and the duration is still right.
+# ------------------------------------------------------------------------------
+PING_BUCKETS = tuple(0.0001 * 2 ** i for i in range(16))
+
+class StallWatchdog:
+    def __init__(self, interval: float = 0.1, slow_after: float = 0.1, keep: int = 20, frames: int = 12):
+        self.interval = interval
+        self.slow_after = slow_after
+        self.frames = frames
+        self.pings = [0] * (len(PING_BUCKETS) + 1)
+        self.ping_sum = 0.0
+        self.stalls = deque(maxlen=keep)
+        self.stall_count = 0
+        self.slowest = 0.0
+        self._loop = None
+        self._loop_thread = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(self._pong, sent, answered)
+            except RuntimeError:
+                return
+            if answered.wait(self.slow_after):
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame)[-self.frames:] if frame is not None else []
+            while not answered.wait(0.5):
+                if self._stop.is_set():
+                    return
+            try:
+                self._loop.call_soon_threadsafe(self._record, sent, answered.delay, stack)
+            except RuntimeError:
+                return
+
+    def _pong(self, sent: float, answered: threading.Event):
+        delay = time.monotonic() - sent
+        self.pings[bisect_left(PING_BUCKETS, delay)] += 1
+        self.ping_sum += delay
+        answered.delay = delay
+        answered.set()
+
+    def _record(self, sent: float, seconds: float, stack: list):
+        where = stack[-1].strip().splitlines()[0] if stack else "unknown"
+        self.stall_count += 1
+        self.slowest = max(self.slowest, seconds)
+        self.stalls.append({"at": time.time() - (time.monotonic() - sent), "seconds": seconds,
+                            "where": where, "stack": "".join(stack)})
+        log.warning("slow_step", stage="event_loop", latency=round(seconds, 3), outcome="stalled",
+                    where=where, stack="".join(stack))
+
+    def report(self) -> str:
+        """Plain-text list of the recent stalls, newest first, for /stalls."""
+        if not self.stalls:
+            return f"No event loop step over {self.slow_after * 1e3:.0f} ms\n"
+        lines = []
+        for stall in reversed(self.stalls):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(stall["at"]))
+            lines.append(f"{stamp} UTC  {stall['seconds'] * 1e3:.0f} ms  {stall['where']}")
+            lines.append(stall["stack"])
+        return "\n".join(lines) + "\n"
+
+    def metrics(self) -> list:
+        """Collector for HealthServer: ping delay histogram and stall counts."""
+        buckets, total = [], 0
+        for bound, count in zip(PING_BUCKETS + (float("inf"),), self.pings):
+            total += count
+            buckets.append(({"le": "+Inf" if bound == float("inf") else f"{bound:g}"}, total))
+        return (
+            ["# HELP bot_event_loop_ping_seconds Delay of the watchdog's pings on the event loop",
+             "# TYPE bot_event_loop_ping_seconds histogram"]
+            + [sample("bot_event_loop_ping_seconds_bucket", labels, count) for labels, count in buckets]
+            + [sample("bot_event_loop_ping_seconds_sum", {}, f"{self.ping_sum:.6f}"),
+               sample("bot_event_loop_ping_seconds_count", {}, total)]
+            + metric("bot_event_loop_slow_steps_total", "counter",
+                     f"Event loop steps that blocked it for over {self.slow_after:g}s", [({}, self.stall_count)])
+            + metric("bot_event_loop_slowest_step_seconds", "gauge", "Longest event loop stall since start",
+                     [({}, f"{self.slowest:.6f}")])
+        )
+
+def sample(name: str, labels: dict, value) -> str:
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+def metric(name: str, kind: str, help_text: str, samples) -> list:
+    """Format one metric family; samples are (labels dict, value) pairs."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [sample(name, labels, value) for labels, value in samples]
+    return lines
+
+class HealthServer:
+    def __init__(self, bots: list, monitor: LoopLagMonitor, host: str = "0.0.0.0", port: int = 8000,
+                 max_lag: float = 2.0, stall_after: float = 120.0, watchdog: StallWatchdog = None):
+        self.bots = bots
+        self.monitor = monitor
+        self.watchdog = watchdog
+        self.host = host
+        self.port = port
+        self.max_lag = max_lag
+        self.stall_after = stall_after
+        self.started = time.monotonic()
+        self.collectors = [self.core_metrics]
+        self.checks = []
+        if watchdog is not None:
+            self.collectors.append(watchdog.metrics)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --------------------------------------------------------------------------
+    # Checks
+    # --------------------------------------------------------------------------
+    def last_edit_age(self, bot) -> float:
+        last = bot.scheduler.last_edit
+        return time.monotonic() - (last if last is not None else self.started)
+
+    def problems(self) -> list:
+        problems = []
+        if self.monitor.lag > self.max_lag:
+            problems.append(f"event loop lag {self.monitor.lag:.2f}s")
+        for bot in self.bots:
+            depth = bot.scheduler.depth
+            age = self.last_edit_age(bot)
+            if depth and age > self.stall_after:
+                problems.append(f"{bot.profile.name}: {depth} calls queued, no successful edit for {age:.0f}s")
+        for check in self.checks:
+            problems += check()
+        return problems
+
+    def core_metrics(self) -> list:
+        def per_bot(value):
+            return [({"bot": bot.profile.name}, value(bot)) for bot in self.bots]
+
+        return (
+            metric("bot_up", "gauge", "1 if the bot's client is connected",
+                   per_bot(lambda b: int(bool(getattr(b.client, "is_connected", False)))))
+            + metric("bot_event_loop_lag_seconds", "gauge", "Last measured event loop lag",
+                     [({}, f"{self.monitor.lag:.6f}")])
+            + metric("bot_event_loop_lag_max_seconds", "gauge", "Largest event loop lag since start",
+                     [({}, f"{self.monitor.max_lag:.6f}")])
+            + metric("bot_last_edit_age_seconds", "gauge", "Seconds since the last successful caption edit",
+                     per_bot(lambda b: f"{self.last_edit_age(b):.3f}"))
+            + metric("bot_scheduler_depth", "gauge", "Telegram calls queued or in flight",
+                     per_bot(lambda b: b.scheduler.depth))
+            + metric("bot_flood_waits_total", "counter", "FloodWait errors received",
+                     per_bot(lambda b: b.scheduler.flood_waits))
+        )
+
+    # --------------------------------------------------------------------------
+    # HTTP
+    # --------------------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else ""
+
+            content_type = "text/plain; charset=utf-8"
+            if path in ("/", "/health"):
+                problems = self.problems()
+                status, body = ("200 OK", "OK\n") if not problems else \
+                    ("503 Service Unavailable", "UNHEALTHY\n" + "\n".join(problems) + "\n")
+            elif path == "/metrics":
+                status = "200 OK"
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+                body = "\n".join(line for collect in self.collectors for line in collect()) + "\n"
+            elif path == "/stalls" and self.watchdog is not None:
+                status, body = "200 OK", self.watchdog.report()
+            else:
+                status, body = "404 Not Found", "Not Found\n"
+
+            payload = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            log.error("health_request_failed", error=str(e), error_type=type(e).__name__)
+        finally:
+            writer.close()
@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+import tomllib
+
+from pyrogram import Client, filters, idle
+from pyrogram.handlers import MessageHandler
+
+from catchup import CatchUp, catchup_metrics
+from classifier import AUTO, FormatClassifier
+from commands import Commands, START_TEXTS
+from counter_store import CounterStore, ChatCounters
+from fileindex import FileIndex
+from health import HealthServer, LoopLagMonitor, StallWatchdog, metric
+from jsonlog import log
+from media import DUPLICATE_POLICIES, MediaHandler
+from metrics import Metrics, prometheus
+from rules import RULES_FILE, RuleError, load_rules
+from rulewatch import RulesWatcher
+from scheduler import EditScheduler
+from seen import SeenSet
+
+# ------------------------------------------------------------------------------
+# Multi-bot host: one process, one event loop, N bots.
+#
+#   python host.py                       # every bot in bots.toml with a token set
+#   python host.py --config other.toml
+#   python host.py --dry-run             # build the bots without connecting and
+#                                        # print startup time / peak RSS as JSON
+#
+# Each [[bot]] entry in the config is a profile:
+#
+#   name            unique label used in logs
+#   format          caption format, the name of a rule in the rules file, or
+#                   "auto" to recognise each caption's format (classifier.py)
+#   default_format  with "auto": rule for captions in no known format
+#                   (default: plain; chat overrides stored as .formats)
+#   rules           caption rules file, relative to the config file (default:
+#                   the rules.toml next to host.py, see rules.py)
+#   session         pyrogram session name (default: name)
+#   numbering_file  counter file (default: numbering_state_<name>.txt)
+#   token_env       environment variable holding the bot token (default: BOT_TOKEN)
+#   pdf_fallback    re-post PDFs whose caption cannot be cleared (default: true)
+#   seen_capacity   processed messages remembered to skip redelivered updates
+#                   (default: 65536; stored next to numbering_file as .seen)
+#   duplicate_policy  what to do with a re-posted video (same file_unique_id):
+#                   "reuse" its first number and caption, "skip" it, or number
+#                   it as "new" (default: reuse; index stored as .fidx/.fcap)
+#   file_index_capacity  slots of a new re-post index, a power of two; size it
+#                   for the expected number of videos to skip table doublings
+#                   (default: 65536, see fileindex.py)
+#   reorder_window  seconds videos wait so that numbers follow message_id order
+#                   when updates arrive out of order (default: 0.3, see media.py)
+#   catch_up        on startup, number what was posted while the bot was down
+#                   before switching to live updates (default: true, see
+#                   catchup.py)
+#   start_text      /start reply (default: the format's text in commands.py;
+#                   required for formats that have none)
+#
+# API_ID and API_HASH are shared by all bots. Every bot gets its own Client,
+# CounterStore, EditScheduler and MediaHandler, so sessions, counters, rate
+# limits and caption rules never leak between bots; what they share is the
+# interpreter, the imported modules and one health/metrics endpoint (health.py)
+# on the same event loop. Each rules file is compiled once, when the first
+# profile using it is read, and its bots share the rules' render caches
+# (rules.py). Rules files are watched while the bots run (rulewatch.py): an
+# edited file is recompiled in the background and swapped in between two
+# updates, without reconnecting; a file that fails to compile or drops a rule a
+# bot uses is rejected and the bots keep the rules they have. A profile whose
+# token variable is unset is skipped, and a bot that fails to log in is
+# reported without taking the others down.
+#
+# A watchdog thread (health.StallWatchdog) pings the shared loop every 100 ms;
+# a step that keeps it busy for over SLOW_STEP seconds is logged as slow_step
+# with the stack it was running, counted on /metrics and listed on /stalls.
+#
+# On SIGTERM / SIGINT every bot stops taking updates (what it misses is caught
+# up on the next start), releases its buffered videos and waits up to
+# SHUTDOWN_TIMEOUT seconds for the caption edits in flight, within docker
+# stop's 10 second grace period. Edits still unfinished are saved for the next
+# start (catchup.py); then the clients disconnect and the counter journals are
+# compacted and fsynced.
+#
+# The single-bot scripts (bot.py, pr.py, ...) are one-profile wrappers around
+# run_profiles(). BotInstance takes its client ready-made, so loadgen.py can
+# drive the same pipeline with a fake Telegram backend.
+# ------------------------------------------------------------------------------
+DEFAULT_CONFIG = "bots.toml"
+HEALTH_PORT = 8000
+SLOW_STEP = 0.1
+SHUTDOWN_TIMEOUT = 8.0
+
+_rules = {}
+
+def caption_rules(path: str) -> dict:
+    """Compiled rules of a rules file, compiled once per process and shared by its bots."""
+    if path not in _rules:
+        _rules[path] = load_rules(path)
+    return _rules[path]
+
+def apply_rules(instances: list, path: str, rules: dict):
+    """Swap recompiled rules of `path` into every bot using it, or raise
+    RuleError without touching any bot if one of them would lose its rule."""
+    users = [i for i in instances if i.profile.rules == path]
+    for instance in users:
+        profile = instance.profile
+        rule = profile.default_format if profile.format == AUTO else profile.format
+        if rule not in rules:
+            raise RuleError(f"bot {profile.name!r} uses rule {rule!r}, which is missing")
+    _rules[path] = rules
+    for instance in users:
+        instance.use_rules(rules)
+
+def cache_metrics() -> list:
+    """Render cache hits and misses per rule (collector for health.HealthServer)."""
+    caches = [({"rules": path, "rule": name}, rule.cache)
+              for path, rules in _rules.items() for name, rule in rules.items() if rule.cache is not None]
+    return (metric("bot_caption_cache_hits_total", "counter", "Captions rendered from the render cache",
+                   [(labels, cache.hits) for labels, cache in caches])
+            + metric("bot_caption_cache_misses_total", "counter", "Captions rendered by the rule and cached",
+                     [(labels, cache.misses) for labels, cache in caches])
+            + metric("bot_caption_cache_entries", "gauge", "Captions held in the render cache",
+                     [(labels, len(cache)) for labels, cache in caches]))
+
+def storage_problems(bots: list) -> list:
+    """Bots whose state files cannot be written (check for health.HealthServer)."""
+    return ([f"{b.profile.name}: cannot write {b.counter_store.journal_path}" for b in bots if b.counter_store.failing]
+            + [f"{b.profile.name}: cannot write {b.files.index_path}" for b in bots if b.files.failing])
+
+def storage_metrics(bots: list) -> list:
+    """Failed writes of the bots' state files (collector for health.HealthServer)."""
+    return metric("bot_state_write_errors_total", "counter", "Failed writes of a bot's state files",
+                  [({"bot": b.profile.name, "store": "counters"}, b.counter_store.write_errors) for b in bots]
+                  + [({"bot": b.profile.name, "store": "file_index"}, b.files.write_errors) for b in bots])
+
+class BotProfile:
+    def __init__(self, name: str, format: str, session: str = None, numbering_file: str = None,
+                 token_env: str = "BOT_TOKEN", pdf_fallback: bool = True, start_text: str = None,
+                 seen_capacity: int = 65536, duplicate_policy: str = "reuse", rules: str = RULES_FILE,
+                 default_format: str = "plain", reorder_window: float = 0.3, catch_up: bool = True,
+                 file_index_capacity: int = 1 << 16):
+        known = caption_rules(rules)
+        rule = default_format if format == AUTO else format
+        if rule not in known:
+            raise ValueError(f"❌ Bot {name!r}: no caption rule {rule!r} in {rules} (known: {', '.join(sorted(known))})")
+        if not start_text and format not in START_TEXTS:
+            raise ValueError(f"❌ Bot {name!r}: format {format!r} has no default start_text; set one")
+        if reorder_window < 0:
+            raise ValueError(f"❌ Bot {name!r}: reorder_window must not be negative")
+        if file_index_capacity < 1 or file_index_capacity & (file_index_capacity - 1):
+            raise ValueError(f"❌ Bot {name!r}: file_index_capacity must be a power of two")
+        if duplicate_policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"❌ Bot {name!r}: unknown duplicate_policy {duplicate_policy!r} (known: {', '.join(DUPLICATE_POLICIES)})")
+        self.name = name
+        self.format = format
+        self.rules = rules
+        self.default_format = default_format
+        self.session = session or name
+        self.numbering_file = numbering_file or f"numbering_state_{name}.txt"
+        self.token_env = token_env
+        self.pdf_fallback = pdf_fallback
+        self.start_text = start_text or START_TEXTS[format]
+        self.seen_capacity = seen_capacity
+        self.duplicate_policy = duplicate_policy
+        self.reorder_window = reorder_window
+        self.catch_up = catch_up
+        self.file_index_capacity = file_index_capacity
+
+def load_profiles(path: str) -> list:
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    config_dir = os.path.dirname(os.path.abspath(path))
+    profiles = []
+    try:
+        for entry in config.get("bot", []):
+            if isinstance(entry.get("rules"), str):
+                entry["rules"] = os.path.join(config_dir, entry["rules"])
+            profiles.append(BotProfile(**entry))
+    except TypeError as e:
+        raise ValueError(f"❌ {path}: invalid bot profile: {e}")
+    for attr in ("name", "session", "numbering_file"):
+        seen = set()
+        for profile in profiles:
+            value = getattr(profile, attr)
+            if value in seen:
+                raise ValueError(f"❌ {path}: {attr} {value!r} is used by more than one bot")
+            seen.add(value)
+    return profiles
+
+# ------------------------------------------------------------------------------
+# One bot: client, counters, scheduler and handlers
+# ------------------------------------------------------------------------------
+class BotInstance:
+    def __init__(self, profile: BotProfile, client, scheduler_options: dict = None):
+        self.profile = profile
+        self.client = client
+        self.metrics = Metrics()
+        self.counter_store = CounterStore(profile.numbering_file)
+        self.counters = ChatCounters(self.counter_store, self.metrics)
+        self.scheduler = EditScheduler(metrics=self.metrics, name=profile.name, **(scheduler_options or {}))
+        state_base = os.path.splitext(profile.numbering_file)[0]
+        self.seen = SeenSet(state_base + ".seen", profile.seen_capacity)
+        self.files = FileIndex(state_base, profile.file_index_capacity)
+        rules = caption_rules(profile.rules)
+        self.classifier = None
+        if profile.format == AUTO:
+            self.classifier = FormatClassifier(rules, profile.default_format, state_base + ".formats", self.metrics)
+            render = self.classifier.render
+        else:
+            render = rules[profile.format].cached_render
+        self.media = MediaHandler(self.counters, self.scheduler, render,
+                                  pdf_fallback=profile.pdf_fallback, seen=self.seen, files=self.files,
+                                  duplicate_policy=profile.duplicate_policy, classifier=self.classifier,
+                                  reorder_window=profile.reorder_window)
+        self.commands = Commands(self.media, profile.start_text)
+        self.catchup = CatchUp(client, self.media, profile.name, unfinished_path=state_base + ".unfinished")
+        self.catchup_task = None
+        self.stopping = False
+
+        for callback, message_filter in (
+            (self.on_media, filters.media),
+            (self.commands.start, filters.command("start")),
+            (self.commands.reset, filters.command("reset")),
+            (self.commands.set_number, filters.command("set")),
+            (self.commands.renumber, filters.command("renumber")),
+            (self.commands.stats, filters.command("stats")),
+            (self.commands.set_format, filters.command("format")),
+        ):
+            self.client.add_handler(MessageHandler(callback, message_filter))
+
+    def use_rules(self, rules: dict):
+        if self.classifier is not None:
+            self.classifier.update(rules)
+        else:
+            self.media.render = rules[self.profile.format].cached_render
+
+    async def on_media(self, client, message):
+        if self.stopping:
+            return
+        if not self.catchup.hold(message):
+            await self.media.handle(message)
+
+    def start_catch_up(self):
+        self.catchup_task = asyncio.ensure_future(self.catchup.run())
+
+    async def shutdown(self, timeout: float):
+        """Stop taking updates, finish buffered videos and caption edits within
+        timeout seconds and save whatever is left for the next start."""
+        self.stopping = True
+        self.catchup.stop()
+        self.media.flush()
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("shutdown_deadline", bot=self.profile.name, stage="shutdown", latency=timeout,
+                        in_flight=len(self.media.unfinished), outcome="timeout")
+        except Exception as e:
+            log.error("shutdown_failed", bot=self.profile.name, stage="shutdown", outcome="error",
+                      error=str(e), error_type=type(e).__name__)
+        self.media.cancel()
+        self.catchup.save_unfinished()
+
+    async def _drain(self):
+        if self.catchup_task is not None:
+            try:
+                await self.catchup_task
+            except Exception as e:
+                log.error("catch_up_failed", bot=self.profile.name, stage="shutdown", outcome="error",
+                          error=str(e), error_type=type(e).__name__)
+        await self.media.drain()
+
+    def close(self):
+        self.counter_store.close()
+        self.seen.close()
+        self.files.close()
+
+def build_instances(profiles: list) -> list:
+    api_id = int(os.getenv("API_ID", "0"))
+    api_hash = os.getenv("API_HASH", "")
+    if not api_id or not api_hash:
+        raise ValueError("❌ API_ID or API_HASH is missing! Set them in your environment variables.")
+
+    instances = []
+    for profile in profiles:
+        token = os.getenv(profile.token_env, "")
+        if not token:
+            log.info("bot_skipped", bot=profile.name, reason=f"{profile.token_env} is not set")
+            continue
+        client = Client(profile.session, api_id=api_id, api_hash=api_hash, bot_token=token)
+        instances.append(BotInstance(profile, client))
+    if not instances:
+        raise ValueError("❌ No bot token is set! Set the token_env variable of at least one bot.")
+    return instances
+
+# ------------------------------------------------------------------------------
+# Run
+# ------------------------------------------------------------------------------
+async def serve(profiles: list):
+    started = time.monotonic()
+    instances = build_instances(profiles)
+    monitor = LoopLagMonitor()
+    monitor.start()
+    watchdog = StallWatchdog(slow_after=SLOW_STEP)
+    watchdog.start()
+    watcher = RulesWatcher(list(_rules), lambda path, rules: apply_rules(instances, path, rules))
+    watcher.start()
+    health = HealthServer(instances, monitor, port=HEALTH_PORT, watchdog=watchdog)
+    health.collectors.append(lambda: prometheus(instances))
+    health.collectors.append(lambda: catchup_metrics(instances))
+    health.collectors.append(cache_metrics)
+    health.collectors.append(lambda: storage_metrics(instances))
+    health.checks.append(lambda: storage_problems(instances))
+    await health.start()
+
+    for instance in instances:
+        if instance.profile.catch_up:
+            instance.catchup.begin()
+    results = await asyncio.gather(*(i.client.start() for i in instances), return_exceptions=True)
+
+    running = []
+    for instance, result in zip(instances, results):
+        if isinstance(result, BaseException):
+            log.error("bot_start_failed", bot=instance.profile.name, outcome="error",
+                      error=str(result), error_type=type(result).__name__)
+        else:
+            running.append(instance)
+    if not running:
+        raise RuntimeError("❌ No bot could be started.")
+    names = ", ".join(i.profile.name for i in running)
+    log.info("started", bots=names, latency=round(time.monotonic() - started, 3))
+    for instance in running:
+        instance.start_catch_up()
+
+    try:
+        await idle()
+    finally:
+        log.info("stopping", bots=names, timeout=SHUTDOWN_TIMEOUT)
+        await asyncio.gather(*(i.shutdown(SHUTDOWN_TIMEOUT) for i in running))
+        for instance in running:
+            await instance.client.stop()
+        for instance in instances:
+            instance.close()
+        await health.stop()
+        watcher.stop()
+        watchdog.stop()
+        monitor.stop()
+
+async def dry_run(profiles: list) -> dict:
+    started = time.monotonic()
+    instances = build_instances(profiles)
+    return {
+        "bots": len(instances),
+        "build_s": time.monotonic() - started,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def run_profiles(profiles: list):
+    asyncio.run(serve(profiles))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several caption bots in one process")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="TOML file with [[bot]] profiles")
+    parser.add_argument("--dry-run", action="store_true", help="build the bots without connecting, print stats and exit")
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.config)
+    if args.dry_run:
+        print(json.dumps(asyncio.run(dry_run(profiles))))
+    else:
+        run_profiles(profiles)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+# Structured logging off the event loop.
+#
+#   from jsonlog import log
+#   log.error("edit_failed", chat_id=..., message_id=..., stage="edit",
+#             latency=0.41, outcome="error", error=str(e))
+#
+# One JSON object per line on stdout: ts, level, event and the given fields
+# (handlers pass chat_id, message_id, stage, latency and outcome where they
+# have them). A call only builds a dict and puts it on a bounded queue; a
+# background thread serializes and writes, so a slow or blocked stdout (a
+# full docker log pipe) never reaches the event loop. When the queue is full
+# the record is dropped and counted; the writer reports the count as a
+# "log_dropped" record once it catches up.
+#
+# Warnings and errors are sampled per (event, error type): at most `burst`
+# records per `window` seconds for each, so a FloodWait storm or a dead chat
+# logs a handful of lines instead of one per call. The next record let
+# through carries the number suppressed since the last one ("suppressed").
+#
+# LOG_LEVEL (debug, info, warning, error; default info) sets the threshold;
+# per-edit outcomes are logged at debug.
+# ------------------------------------------------------------------------------
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+class JsonLog:
+    def __init__(self, stream=None, level: str = None, capacity: int = 10000,
+                 burst: int = 10, window: float = 10.0):
+        self.stream = stream
+        self.threshold = LEVELS[(level or os.getenv("LOG_LEVEL", "info")).lower()]
+        self.burst = burst
+        self.window = window
+        self.dropped = 0
+        self._queue = queue.Queue(capacity)
+        self._samples = {}
+        self._writer = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+
+    def debug(self, event: str, **fields):
+        self.emit("debug", event, fields)
+
+    def info(self, event: str, **fields):
+        self.emit("info", event, fields)
+
+    def warning(self, event: str, **fields):
+        self.emit("warning", event, fields)
+
+    def error(self, event: str, **fields):
+        self.emit("error", event, fields)
+
+    def emit(self, level: str, event: str, fields: dict):
+        if LEVELS[level] < self.threshold or self._closed:
+            return
+        now = time.time()
+        if LEVELS[level] >= LEVELS["warning"]:
+            suppressed = self._sample((event, fields.get("error_type")), now)
+            if suppressed is None:
+                return
+            if suppressed:
+                fields["suppressed"] = suppressed
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait((now, level, event, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def _sample(self, key, now: float):
+        """None to suppress the record, else how many were suppressed before it."""
+        sample = self._samples.get(key)
+        if sample is None or now - sample[0] >= self.window:
+            suppressed = sample[2] if sample is not None else 0
+            self._samples[key] = [now, 1, 0]
+            return suppressed
+        if sample[1] < self.burst:
+            sample[1] += 1
+            return 0
+        sample[2] += 1
+        return None
+
+    # --------------------------------------------------------------------------
+    # Writer thread
+    # --------------------------------------------------------------------------
+    def _start(self):
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="jsonlog", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    @staticmethod
+    def _encode(record) -> str:
+        ts, level, event, fields = record
+        line = {"ts": round(ts, 3), "level": level, "event": event}
+        line.update(fields)
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+    def _run_writer(self):
+        reported = 0
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in records
+            lines = [self._encode(record) for record in records if record is not None]
+            if self.dropped != reported:
+                lines.append(self._encode((time.time(), "warning", "log_dropped",
+                                           {"count": self.dropped - reported})))
+                reported = self.dropped
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("\n".join(lines) + "\n" if lines else "")
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+            if done:
+                return
+
+    def close(self, timeout: float = 2.0):
+        """Write what is queued and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            self._writer.join(timeout)
+
+log = JsonLog()
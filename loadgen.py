@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import copy
+import importlib
+import io
+import json
+import random
+import tempfile
+import time
+
+from pyrogram.errors import FloodWait, MessageIdInvalid
+
+from bench import RULE_SAMPLES
+from host import BotInstance, load_profiles
+from jsonlog import log
+
+# ------------------------------------------------------------------------------
+# Offline load generator: runs the real bot pipeline (BotInstance: counters,
+# scheduler, media handler, caption rules) against a fake Telegram backend, so
+# throughput, latency and numbering can be measured without credentials.
+#
+#   python loadgen.py                          # every bot script, 200 msg/s, 10 s
+#   python loadgen.py --bots bot,pr --rate 500 --duration 5
+#   python loadgen.py --config bots.toml       # the host.py profiles instead
+#   python loadgen.py --latency 80 --error-rate 0.02 --flood-rate 0.01 --json
+#
+# The backend answers edit_caption / reply_video / reply_document after a
+# random latency (uniform, +-50% around --latency ms). An edit can fail with
+# MessageIdInvalid (--error-rate, exercising the re-post fallback) and any call
+# with FloodWait (--flood-rate, exercising the scheduler's back-off). Replies
+# never fail otherwise, so every video ends up with exactly one caption.
+#
+# The update stream is open loop: events start at --rate per second whatever
+# the bot's backlog, spread over --chats chats. An event is a single video, a
+# PDF (--pdf-share) or an album of 2-10 videos (--album-share) whose items
+# arrive in shuffled order; --redeliver-share of the messages are delivered a
+# second time, as Telegram does after a reconnect. Each delivery is delayed by
+# up to --delivery-jitter ms, like concurrent handlers picking updates up out
+# of order.
+#
+# Per bot it reports the sustained rate (finished messages over the time from
+# the first arrival to the last caption), end-to-end latency percentiles (from
+# arrival to the caption Telegram accepted, so albums include the collection
+# window) and a numbering check: every chat's videos hold exactly the numbers
+# 1..n in message_id order, albums are contiguous, and the caption Telegram
+# holds is the one recorded for that number. Telegram's rate limits are off by
+# default (--limits telegram restores them) so the numbers measure the bot,
+# not the 20-messages-per-minute chat limit. The bots' log (jsonlog.py) is
+# discarded unless --verbose.
+# ------------------------------------------------------------------------------
+SCRIPTS = ("bot", "bot1", "bo", "eng", "nidhi", "pr")
+UNLIMITED = {"chat_rate": 1e9, "chat_burst": 1e9, "global_rate": 1e9, "global_burst": 1e9}
+
+class FakeTelegram:
+    """Answers the message methods the bots call, with injected latency and errors."""
+
+    def __init__(self, rng: random.Random, latency: float = 0.05, error_rate: float = 0.0,
+                 flood_rate: float = 0.0, flood_wait: int = 0):
+        self.rng = rng
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.flood_wait = flood_wait
+        self.calls = {}
+        self.captions = {}
+        self.done = {}
+        self.refused = set()
+
+    async def call(self, method: str, message, caption: str = None):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < self.flood_rate:
+            raise FloodWait(value=self.flood_wait)
+        if method == "edit_caption" and self.rng.random() < self.error_rate:
+            self.refused.add((message.chat.id, message.id))
+            raise MessageIdInvalid()
+        if caption is not None:
+            key = (message.chat.id, message.id)
+            self.captions[key] = caption
+            self.done[key] = time.perf_counter()
+        return message
+
+class FakeClient:
+    """Stands in for pyrogram.Client: collects handlers, never connects."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def add_handler(self, handler, group: int = 0):
+        self.handlers.append(handler)
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+class FakeVideo:
+    def __init__(self, file_id: str, file_unique_id: str):
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+
+class FakeDocument:
+    def __init__(self, file_id: str, mime_type: str = "application/pdf"):
+        self.file_id = file_id
+        self.mime_type = mime_type
+
+class FakeMessage:
+    def __init__(self, backend: FakeTelegram, chat: FakeChat, message_id: int, caption: str,
+                 video: FakeVideo = None, document: FakeDocument = None, media_group_id: str = None):
+        self.backend = backend
+        self.chat = chat
+        self.id = message_id
+        self.caption = caption
+        self.caption_entities = None
+        self.video = video
+        self.document = document
+        self.media_group_id = media_group_id
+
+    async def edit_caption(self, caption: str, parse_mode=None):
+        return await self.backend.call("edit_caption", self, caption)
+
+    async def reply_video(self, file_id: str, caption: str = "", parse_mode=None):
+        return await self.backend.call("reply_video", self, caption)
+
+    async def reply_document(self, file_id: str, caption: str = "", parse_mode=None):
+        return await self.backend.call("reply_document", self, caption)
+
+    async def reply(self, text: str, **kwargs):
+        return await self.backend.call("reply", self)
+
+# ------------------------------------------------------------------------------
+# Synthetic update stream
+# ------------------------------------------------------------------------------
+def synthetic_events(backend: FakeTelegram, rng: random.Random, count: int, chats: int, captions: list,
+                     pdf_share: float, album_share: float) -> list:
+    """count events, each a list of messages delivered back to back."""
+    chat_list = [FakeChat(-1000000000000 - i) for i in range(chats)]
+    next_id = dict.fromkeys(range(chats), 1)
+    events = []
+    for n in range(count):
+        c = rng.randrange(chats)
+        roll = rng.random()
+        if roll < pdf_share:
+            size, kind = 1, "pdf"
+        elif roll < pdf_share + album_share:
+            size, kind = rng.randint(2, 10), "album"
+        else:
+            size, kind = 1, "video"
+        messages = []
+        for _ in range(size):
+            message_id = next_id[c]
+            next_id[c] += 1
+            file_id = f"file-{c}-{message_id}"
+            if kind == "pdf":
+                messages.append(FakeMessage(backend, chat_list[c], message_id, "Notes.pdf",
+                                            document=FakeDocument(file_id)))
+            else:
+                messages.append(FakeMessage(backend, chat_list[c], message_id, rng.choice(captions),
+                                            video=FakeVideo(file_id, f"unique-{c}-{message_id}"),
+                                            media_group_id=f"album-{n}" if kind == "album" else None))
+        rng.shuffle(messages)
+        events.append(messages)
+    return events
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+# ------------------------------------------------------------------------------
+# One bot under load
+# ------------------------------------------------------------------------------
+async def run_bot(profile, args) -> dict:
+    rng = random.Random(args.seed)
+    backend = FakeTelegram(rng, args.latency / 1e3, args.error_rate, args.flood_rate, args.flood_wait)
+    limits = None if args.limits == "telegram" else UNLIMITED
+    state = tempfile.TemporaryDirectory(prefix="loadgen-")
+    profile = copy.copy(profile)
+    profile.numbering_file = f"{state.name}/{profile.name}.txt"
+    instance = BotInstance(profile, FakeClient(), limits)
+    client = instance.client
+
+    if profile.format in RULE_SAMPLES:
+        captions = [RULE_SAMPLES[profile.format]]
+    else:
+        captions = list(RULE_SAMPLES.values()) + ["A caption in no known format"]
+    events = synthetic_events(backend, rng, max(1, int(args.rate * args.duration)), args.chats, captions,
+                              args.pdf_share, args.album_share)
+
+    arrived = {}
+    errors = []
+    jitter = args.delivery_jitter / 1e3
+
+    async def deliver(message, delay: float):
+        arrived.setdefault((message.chat.id, message.id), time.perf_counter())
+        await asyncio.sleep(delay)
+        try:
+            await instance.on_media(client, message)
+        except Exception as e:
+            errors.append(e)
+
+    tasks = []
+    started = time.perf_counter()
+    for i, messages in enumerate(events):
+        delay = started + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for message in messages:
+            tasks.append(asyncio.create_task(deliver(message, rng.uniform(0, jitter))))
+            if rng.random() < args.redeliver_share:
+                tasks.append(asyncio.create_task(deliver(message, rng.uniform(0, jitter))))
+    offered = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    await instance.media.drain()
+
+    messages = [m for event in events for m in event]
+    latencies = [backend.done[key] - arrived[key] for key in backend.done]
+    finished = max(backend.done.values(), default=started)
+    result = {
+        "bot": profile.name,
+        "format": profile.format,
+        "messages": len(messages),
+        "offered_per_s": len(messages) / offered if offered else None,
+        "sustained_per_s": len(backend.done) / (finished - started) if finished > started else None,
+        "p50_ms": percentile(latencies, 0.5) * 1e3 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1e3 if latencies else None,
+        "edits": instance.metrics.count("edits"),
+        "fallbacks": instance.metrics.count("fallbacks"),
+        "flood_waits": instance.scheduler.flood_waits,
+        "duplicates": instance.metrics.count("duplicates"),
+        "reordered": instance.metrics.count("reordered"),
+        "errors": len(errors) + instance.metrics.count("edit_errors") - instance.metrics.count("fallbacks"),
+        "problems": check_numbering(instance, backend, events),
+    }
+    instance.close()
+    state.cleanup()
+    return result
+
+def check_numbering(instance, backend: FakeTelegram, events: list) -> list:
+    """Describe every way the numbers and captions Telegram holds differ from the expected ones."""
+    problems = []
+    numbers = {}
+    for messages in events:
+        videos = sorted((m for m in messages if m.video), key=lambda m: m.id)
+        album = []
+        for message in videos:
+            key = (message.chat.id, message.id)
+            known = instance.files.get(message.chat.id, message.video.file_unique_id)
+            if known is None:
+                problems.append(f"video {key} was never numbered")
+                continue
+            number, caption = known
+            numbers.setdefault(message.chat.id, []).append(number)
+            album.append(number)
+            if backend.captions.get(key) != caption:
+                problems.append(f"video {key} holds {backend.captions.get(key)!r}, numbered {caption!r}")
+        if len(album) > 1 and album != list(range(album[0], album[0] + len(album))):
+            problems.append(f"album {videos[0].media_group_id} got numbers {album}")
+        for message in messages:
+            key = (message.chat.id, message.id)
+            if not message.document or (key in backend.refused and not instance.profile.pdf_fallback):
+                continue
+            if backend.captions.get(key) != "":
+                problems.append(f"PDF {key} caption was not cleared")
+    for chat_id, got in numbers.items():
+        if sorted(got) != list(range(1, len(got) + 1)):
+            problems.append(f"chat {chat_id}: {len(got)} videos got {len(set(got))} distinct numbers "
+                            f"in 1..{max(got)}")
+        inversions = sum(a > b for a, b in zip(got, got[1:]))
+        if inversions:
+            problems.append(f"chat {chat_id}: numbers out of message_id order at {inversions} place(s)")
+    return problems
+
+# ------------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------------
+def select_profiles(args) -> list:
+    if args.config:
+        profiles = load_profiles(args.config)
+    else:
+        profiles = [importlib.import_module(script).PROFILE for script in SCRIPTS]
+    if args.bots:
+        wanted = args.bots.split(",")
+        unknown = set(wanted) - {p.name for p in profiles}
+        if unknown:
+            raise ValueError(f"❌ Unknown bot(s): {', '.join(sorted(unknown))}")
+        profiles = [p for p in profiles if p.name in wanted]
+    return profiles
+
+def print_report(results: list):
+    print(f"{'bot':>17} {'format':>17} {'msgs':>6} {'offered/s':>10} {'sustained/s':>12} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'fallbacks':>10} {'floods':>7} {'errors':>7}  numbering")
+    for r in results:
+        print(f"{r['bot']:>17} {r['format']:>17} {r['messages']:>6} {r['offered_per_s'] or 0:>10.1f} "
+              f"{r['sustained_per_s'] or 0:>12.1f} {r['p50_ms'] or 0:>8.1f} {r['p99_ms'] or 0:>8.1f} "
+              f"{r['fallbacks']:>10} {r['flood_waits']:>7} {r['errors']:>7}  "
+              + (f"{len(r['problems'])} problem(s)" if r["problems"] else "ok"))
+    for r in results:
+        for problem in r["problems"][:10]:
+            print(f"{r['bot']}: {problem}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bots with synthetic updates against a fake Telegram")
+    parser.add_argument("--bots", help="comma-separated bot names (default: all)")
+    parser.add_argument("--config", help="host.py TOML config to take the profiles from (default: the bot scripts)")
+    parser.add_argument("--rate", type=float, default=200.0, help="events started per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of updates per bot")
+    parser.add_argument("--chats", type=int, default=20, help="chats the updates are spread over")
+    parser.add_argument("--pdf-share", type=float, default=0.1, help="share of events that are PDFs")
+    parser.add_argument("--album-share", type=float, default=0.1, help="share of events that are albums")
+    parser.add_argument("--redeliver-share", type=float, default=0.01, help="share of messages delivered twice")
+    parser.add_argument("--delivery-jitter", type=float, default=20.0, help="max random delivery delay in ms")
+    parser.add_argument("--latency", type=float, default=50.0, help="mean backend latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of edits refused (re-post fallback)")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of calls answered with FloodWait")
+    parser.add_argument("--flood-wait", type=int, default=0, help="FloodWait seconds (the scheduler adds jitter)")
+    parser.add_argument("--limits", choices=("off", "telegram"), default="off", help="scheduler rate limits")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per bot")
+    parser.add_argument("--verbose", action="store_true", help="show scheduler and handler output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        log.stream = io.StringIO()
+    results = []
+    for profile in select_profiles(args):
+        results.append(asyncio.run(run_bot(profile, args)))
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print_report(results)
+    if any(r["problems"] for r in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import asyncio
+
+from jsonlog import log
+from scheduler import RETRYABLE_ERRORS
+
+# ------------------------------------------------------------------------------
+# Media handler shared by the bot scripts.
+#
+#   - Videos are numbered and their caption is rebuilt with render(caption, num).
+#   - PDFs have their caption cleared.
+#   - Other media is left alone.
+#
+# With a SeenSet (seen.py), a video whose (chat_id, message_id) was already
+# handled, e.g. an update redelivered after a reconnect, is skipped before a
+# number is reserved for it. A video is recorded as seen once its number is
+# reserved, not when it enters the reorder buffer, so one lost in the buffer
+# by a crash or whose numbering failed is not skipped when it comes again; a
+# redelivery while it is still buffered or being numbered is caught by the
+# buffer itself. A batch whose numbering fails is logged and the chat's buffer
+# goes on with the next one.
+#
+# With a FileIndex (fileindex.py), a video whose file_unique_id was already
+# numbered in the same chat is a re-post, handled by duplicate_policy:
+#   reuse   edit in the caption (and number) it got the first time (default)
+#   skip    leave the re-post untouched
+#   new     number it like a new video
+# Re-posts under "reuse" and "skip" never touch the counter or the caption
+# rules.
+#
+# Numbers follow message_id order within a chat, whatever order concurrent
+# handlers deliver the updates in. Videos wait in their chat's reorder buffer
+# and are released in message_id order: at once when the lowest pending one
+# directly follows the last message handled in the chat (nothing can be
+# missing before it), otherwise once it has waited reorder_window seconds, so
+# a video delivered a little late still gets its number before the later ones.
+# Each release gets a contiguous range of numbers from a single counter
+# reservation (one lock acquisition, one journal write), and its captions are
+# edited concurrently through the scheduler while the buffer goes on releasing.
+#
+# Albums (media_group_id) arrive as one update per item. An album stays open
+# for album_window seconds after its first item (or until Telegram's 10-item
+# limit) and only holds back the videos after it, so an album is numbered as
+# one contiguous range and no video waits longer than reorder_window +
+# album_window. A video that arrives after later ones were already numbered
+# gets the next free number.
+#
+# Every handled message advances the chat's last handled id in ChatCounters,
+# but never past a video still waiting in the chat's buffer (or being
+# numbered), so after a crash catch-up starts before it.
+# After a restart, catchup.py hands the messages posted since then to
+# catch_up() in batches, which numbers them without going through the buffer.
+#
+# With a FormatClassifier (classifier.py), the caption format is picked per
+# caption (or per chat, when overridden) instead of using the single render.
+#
+# Every caption edit is listed in `unfinished` until Telegram has answered it
+# or refused it for good; an edit that ran out of retries (FloodWait, network)
+# or was cancelled stays listed.
+# On shutdown, flush() releases the buffers at once, drain() waits for the
+# edits, and whatever is still unfinished at the deadline is saved by
+# catchup.py and edited on the next start.
+#
+# Reorder and render times and video / reordered / PDF / ignored counts are
+# recorded in the scheduler's Metrics, next to the counter and edit stages.
+# ------------------------------------------------------------------------------
+ALBUM_LIMIT = 10
+DUPLICATE_POLICIES = ("reuse", "skip", "new")
+
+def is_pdf(message) -> bool:
+    return bool(message.document and message.document.mime_type == "application/pdf")
+
+class MediaHandler:
+    def __init__(self, counters, scheduler, render, pdf_fallback: bool = True, album_window: float = 1.0,
+                 seen=None, files=None, duplicate_policy: str = "reuse", classifier=None,
+                 reorder_window: float = 0.3):
+        if duplicate_policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"❌ Unknown duplicate policy {duplicate_policy!r} (known: {', '.join(DUPLICATE_POLICIES)})")
+        self.counters = counters
+        self.scheduler = scheduler
+        self.render = render
+        self.pdf_fallback = pdf_fallback
+        self.album_window = album_window
+        self.reorder_window = reorder_window
+        self.metrics = scheduler.metrics
+        self.seen = seen
+        self.files = files
+        self.duplicate_policy = duplicate_policy
+        self.classifier = classifier
+        self.unfinished = {}
+        self.closing = False
+        self._buffers = {}
+        self._last_ids = {}
+        self._handled = {}
+        self._tasks = set()
+
+    async def handle(self, message):
+        if message.video:
+            if self._known(message):
+                self.metrics.inc("duplicates")
+                return
+            self._collect(message)
+            return
+        if self._last_ids.get(message.chat.id) == message.id - 1:
+            self._last_ids[message.chat.id] = message.id
+        self._mark_handled(message.chat.id, message.id)
+        if is_pdf(message):
+            await self.track_edit(message, "")
+            self.metrics.inc("pdfs_cleared")
+        else:
+            self.metrics.inc("ignored")
+
+    def _known(self, message) -> bool:
+        """Whether a video was already numbered or is waiting in its chat's buffer."""
+        if self.seen is not None and (message.chat.id, message.id) in self.seen:
+            return True
+        buffer = self._buffers.get(message.chat.id)
+        return buffer is not None and message.id in buffer["ids"]
+
+    def _fresh(self, chat_id, messages) -> list:
+        """Drop the videos that were already numbered."""
+        if self.seen is None:
+            return list(messages)
+        fresh = [message for message in messages if (chat_id, message.id) not in self.seen]
+        if len(fresh) < len(messages):
+            self.metrics.inc("duplicates", len(messages) - len(fresh))
+        return fresh
+
+    def _mark_seen(self, chat_id, messages):
+        """Record videos as numbered, once their numbers are reserved."""
+        if self.seen is not None:
+            for message in messages:
+                self.seen.add(chat_id, message.id)
+
+    def _mark_handled(self, chat_id, message_id: int):
+        """Advance the chat's last handled id up to message_id, but not past a
+        video still buffered or being numbered."""
+        handled = self._handled[chat_id] = max(message_id, self._handled.get(chat_id, message_id))
+        buffer = self._buffers.get(chat_id)
+        if buffer is not None:
+            waiting = [message.id for _, message in buffer["pending"]]
+            if buffer["numbering"] is not None:
+                waiting.append(buffer["numbering"])
+            if waiting:
+                handled = min(handled, min(waiting) - 1)
+        self.counters.mark_handled(chat_id, handled)
+
+    def render_for(self, chat_id):
+        """render(caption, num) to use in chat_id."""
+        if self.classifier is None:
+            return self.render
+        return self.classifier.for_chat(chat_id)
+
+    # --------------------------------------------------------------------------
+    # Numbering: one reservation for the whole batch, edits in parallel
+    # --------------------------------------------------------------------------
+    async def number(self, messages):
+        await self._edit(await self._assign(messages))
+
+    async def _edit(self, edits: list):
+        await asyncio.gather(*edits)
+
+    def track_edit(self, message, caption: str):
+        """Caption edit that stays in self.unfinished until Telegram has answered."""
+        key = (message.chat.id, message.id)
+        self.unfinished[key] = caption
+        return self._tracked_edit(key, message, caption)
+
+    async def _tracked_edit(self, key, message, caption: str):
+        try:
+            await self.scheduler.edit_caption(message, caption, fallback=bool(message.video) or self.pdf_fallback)
+        except RETRYABLE_ERRORS:
+            return  # logged by edit_caption; stays unfinished (as when cancelled)
+        except Exception:
+            self.unfinished.pop(key, None)
+            raise
+        self.unfinished.pop(key, None)
+
+    async def _assign(self, messages) -> list:
+        """Reserve numbers for messages in message_id order and render their
+        captions; return the caption edits to run (none if this raises)."""
+        messages = sorted(messages, key=lambda m: m.id)
+        keys = [(message.chat.id, message.id) for message in messages]
+        edits = []
+        try:
+            if self.files is not None and self.duplicate_policy != "new":
+                fresh = []
+                for message in messages:
+                    known = self.files.get(message.chat.id, message.video.file_unique_id)
+                    if known is None:
+                        fresh.append(message)
+                        continue
+                    self.metrics.inc("reposts")
+                    if self.duplicate_policy == "reuse":
+                        edits.append(self.track_edit(message, known[1]))
+                messages = fresh
+
+            if messages:
+                self.metrics.inc("videos", len(messages))
+                first = await self.counters.reserve(messages[0].chat.id, len(messages))
+                render = self.render_for(messages[0].chat.id)
+                for i, message in enumerate(messages):
+                    with self.metrics.time("render"):
+                        caption = render(message.caption or "", first + i)
+                    if self.files is not None:
+                        self.files.put(message.chat.id, message.video.file_unique_id, first + i, caption)
+                    edits.append(self.track_edit(message, caption))
+        except BaseException:
+            for edit in edits:
+                edit.close()
+            for key in keys:
+                self.unfinished.pop(key, None)
+            raise
+        return edits
+
+    async def catch_up(self, chat_id, messages) -> int:
+        """Handle a batch of consecutive messages of chat_id fetched after a
+        restart (catchup.py) and return how many videos were numbered. The
+        reorder buffer is bypassed: the batch is already complete and ordered."""
+        messages = sorted(messages, key=lambda m: m.id)
+        if not messages:
+            return 0
+        edits = []
+        for message in messages:
+            if is_pdf(message):
+                edits.append(self.track_edit(message, ""))
+                self.metrics.inc("pdfs_cleared")
+        videos = self._fresh(chat_id, [message for message in messages if message.video])
+        edits += await self._assign(videos)
+        self._mark_seen(chat_id, videos)
+        self.counters.mark_handled(chat_id, messages[-1].id)
+        self._last_ids[chat_id] = max(messages[-1].id, self._last_ids.get(chat_id, 0))
+        self.metrics.inc("caught_up", len(videos))
+        await self._edit(edits)
+        return len(videos)
+
+    # --------------------------------------------------------------------------
+    # Reorder buffer
+    # --------------------------------------------------------------------------
+    def _collect(self, message):
+        chat_id = message.chat.id
+        now = asyncio.get_running_loop().time()
+        buffer = self._buffers.get(chat_id)
+        if buffer is None:
+            buffer = self._buffers[chat_id] = {"pending": [], "ids": set(), "albums": {}, "numbering": None,
+                                               "wake": asyncio.Event()}
+            self._spawn(self._release(chat_id, buffer))
+        if buffer["pending"] and message.id < buffer["pending"][-1][1].id:
+            self.metrics.inc("reordered")
+        buffer["pending"].append((now, message))
+        buffer["ids"].add(message.id)
+        if message.media_group_id:
+            album = buffer["albums"].setdefault(message.media_group_id, {"started": now, "count": 0, "first": message.id})
+            album["count"] += 1
+            album["first"] = min(album["first"], message.id)
+            if album["count"] >= ALBUM_LIMIT:
+                buffer["wake"].set()
+
+    def _ready(self, chat_id, buffer, now: float):
+        """Split off the pending videos that can be numbered now, in message_id
+        order; return them and the time the next one may become ready."""
+        blocked_from, next_check = None, None
+        if self.closing:
+            now = float("inf")
+        for album in buffer["albums"].values():
+            closes = album["started"] + self.album_window
+            if album["count"] < ALBUM_LIMIT and closes > now:
+                if blocked_from is None or album["first"] < blocked_from:
+                    blocked_from = album["first"]
+                next_check = closes if next_check is None else min(next_check, closes)
+        pending = sorted(buffer["pending"], key=lambda item: item[1].id)
+        last_id = self._last_ids.get(chat_id)
+        ready = 0
+        for arrived, message in pending:
+            due = arrived + self.reorder_window
+            if blocked_from is not None and message.id >= blocked_from:
+                break
+            if due > now and message.id - 1 != last_id:
+                next_check = due if next_check is None else min(next_check, due)
+                break
+            last_id = message.id
+            ready += 1
+        if ready:
+            self._last_ids[chat_id] = max(last_id, self._last_ids.get(chat_id, last_id))
+        buffer["pending"] = pending[ready:]
+        return pending[:ready], next_check
+
+    async def _release(self, chat_id, buffer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                now = loop.time()
+                ready, next_check = self._ready(chat_id, buffer, now)
+                if ready:
+                    for arrived, _ in ready:
+                        self.metrics.observe("reorder", now - arrived)
+                    left = {message.media_group_id for _, message in buffer["pending"]}
+                    buffer["albums"] = {key: album for key, album in buffer["albums"].items() if key in left}
+                    await self._number_ready(chat_id, buffer, ready)
+                    continue
+                if not buffer["pending"]:
+                    break
+                buffer["wake"].clear()
+                try:
+                    await asyncio.wait_for(buffer["wake"].wait(), next_check - now)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._buffers.get(chat_id) is buffer:
+                del self._buffers[chat_id]
+
+    async def _number_ready(self, chat_id, buffer, ready):
+        """Number one batch of released videos and start their edits. A batch
+        that fails is logged and left unnumbered (and unseen, so a redelivery
+        is numbered), and the buffer goes on with the next one."""
+        videos = self._fresh(chat_id, [message for _, message in ready])
+        buffer["numbering"] = ready[0][1].id
+        edits = []
+        try:
+            edits = await self._assign(videos)
+            self._mark_seen(chat_id, videos)
+        except Exception as e:
+            log.error("numbering_failed", bot=self.scheduler.name, chat_id=chat_id, message_id=ready[0][1].id,
+                      videos=len(videos), stage="number", outcome="error", error=str(e),
+                      error_type=type(e).__name__)
+        finally:
+            buffer["numbering"] = None
+            for _, message in ready:
+                buffer["ids"].discard(message.id)
+        self._mark_handled(chat_id, ready[-1][1].id)
+        if edits:
+            self._spawn(self._edit(edits))
+
+    def flush(self):
+        """Release every buffered video now, without waiting for late updates
+        or open albums (shutdown)."""
+        self.closing = True
+        for buffer in self._buffers.values():
+            buffer["wake"].set()
+
+    async def drain(self):
+        """Wait until every buffered video has been numbered and edited."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            log.error("numbering_failed", bot=self.scheduler.name, stage="number", outcome="error",
+                      error=str(error), error_type=type(error).__name__)
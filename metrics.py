@@ -0,0 +1,161 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from health import metric, sample
+
+# ------------------------------------------------------------------------------
+# Per-stage latency histograms and event counters for the media pipeline.
+#
+# Stages (seconds):
+#   reorder     a batch of videos waiting in the chat's reorder buffer
+#   lock_wait   waiting for the chat's counter lock
+#   reserve     updating the counter (in-memory + journal enqueue)
+#   classify    picking the caption format (format = "auto" bots only)
+#   render      building the caption (including classify)
+#   queue_wait  waiting for a rate-limit token in the EditScheduler
+#   edit        edit_caption round trip, including queue_wait and retries
+#   fallback    reply_video / reply_document re-post after a failed edit
+#
+# Counters: videos, duplicates, reposts, reordered (videos delivered after a
+# later message of the same chat), caught_up (videos numbered by the startup
+# catch-up), edits, edits_skipped (caption edits that would have changed
+# nothing, see scheduler.py), fallbacks, edit_errors, pdfs_cleared, ignored.
+# format = "auto" bots also count captions per chosen format.
+#
+# Histograms use fixed log-spaced buckets (0.1 ms .. ~52 s), so recording is a
+# bisect plus two increments and memory does not grow with traffic. Besides
+# the all-time totals exported on /metrics, every series keeps a ring of
+# slot_seconds-wide slots so /stats can report percentiles and rates over the
+# last minutes; percentiles are interpolated within a bucket.
+# ------------------------------------------------------------------------------
+BUCKETS = tuple(0.0001 * 2 ** i for i in range(20))
+STAGES = ("reorder", "lock_wait", "reserve", "classify", "render", "queue_wait", "edit", "fallback")
+COUNTERS = ("videos", "duplicates", "reposts", "reordered", "caught_up", "edits", "edits_skipped", "fallbacks", "edit_errors", "pdfs_cleared", "ignored")
+WINDOWS = (60, 300, 900)
+
+class Series:
+    """A count vector with an all-time total and a ring of recent time slots."""
+
+    def __init__(self, width: int, slot_seconds: float, slots: int):
+        self.width = width
+        self.slot_seconds = slot_seconds
+        self.total = [0] * width
+        self._slot_ids = [-1] * slots
+        self._slots = [[0] * width for _ in range(slots)]
+
+    def add(self, index: int, amount: int = 1, now: float = None):
+        self.total[index] += amount
+        slot_id = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        i = slot_id % len(self._slots)
+        if self._slot_ids[i] != slot_id:
+            self._slot_ids[i] = slot_id
+            self._slots[i] = [0] * self.width
+        self._slots[i][index] += amount
+
+    def window(self, seconds: float, now: float = None) -> list:
+        current = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        oldest = current - max(1, int(seconds // self.slot_seconds)) + 1
+        counts = [0] * self.width
+        for slot_id, slot in zip(self._slot_ids, self._slots):
+            if oldest <= slot_id <= current:
+                for j, n in enumerate(slot):
+                    counts[j] += n
+        return counts
+
+def percentile(counts: list, q: float):
+    """Estimate the q-quantile (0..1) from histogram bucket counts."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(counts):
+        if n and seen + n >= rank:
+            low = BUCKETS[i - 1] if i else 0.0
+            high = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1] * 2
+            return low + (high - low) * (rank - seen) / n
+        seen += n
+    return BUCKETS[-1] * 2
+
+class Metrics:
+    def __init__(self, slot_seconds: float = 10.0, slots: int = 90):
+        width = len(BUCKETS) + 1
+        self.started = time.monotonic()
+        self.histograms = {stage: Series(width, slot_seconds, slots) for stage in STAGES}
+        self.sums = dict.fromkeys(STAGES, 0.0)
+        self.counters = Series(len(COUNTERS), slot_seconds, slots)
+        self._counter_index = {name: i for i, name in enumerate(COUNTERS)}
+        self.formats = {}
+
+    def observe(self, stage: str, seconds: float):
+        self.histograms[stage].add(bisect_left(BUCKETS, seconds))
+        self.sums[stage] += seconds
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, amount: int = 1):
+        self.counters.add(self._counter_index[name], amount)
+
+    def count(self, name: str) -> int:
+        return self.counters.total[self._counter_index[name]]
+
+    def record_format(self, name: str):
+        self.formats[name] = self.formats.get(name, 0) + 1
+
+    # --------------------------------------------------------------------------
+    # Reports
+    # --------------------------------------------------------------------------
+    def summary(self, windows=WINDOWS) -> str:
+        """Plain-text table for /stats: percentiles and rates per window."""
+        now = time.monotonic()
+        uptime = now - self.started
+        lines = []
+        for seconds in windows:
+            span = min(seconds, uptime) or 1.0
+            counts = dict(zip(COUNTERS, self.counters.window(seconds, now)))
+            lines.append(f"last {seconds // 60} min: {counts['edits'] / span:.2f} edits/s, "
+                         + ", ".join(f"{name} {n}" for name, n in counts.items()))
+            lines.append(f"  {'stage':<10} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for stage in STAGES:
+                buckets = self.histograms[stage].window(seconds, now)
+                n = sum(buckets)
+                if not n:
+                    continue
+                p50, p95, p99 = (percentile(buckets, q) * 1e3 for q in (0.5, 0.95, 0.99))
+                lines.append(f"  {stage:<10} {n:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+        if self.formats:
+            lines.append("formats since start: " + ", ".join(f"{name} {n}" for name, n in sorted(self.formats.items())))
+        return "\n".join(lines)
+
+def prometheus(bots: list) -> list:
+    """Metric lines for every bot's Metrics (collector for health.HealthServer)."""
+    lines = []
+    for name in COUNTERS:
+        lines += metric(f"bot_{name}_total", "counter", f"Media pipeline events: {name}",
+                        [({"bot": b.profile.name}, b.metrics.count(name)) for b in bots])
+
+    lines += metric("bot_caption_format_total", "counter", "Captions rendered per chosen format (auto bots)",
+                    [({"bot": b.profile.name, "format": name}, n)
+                     for b in bots for name, n in sorted(b.metrics.formats.items())])
+
+    lines += ["# HELP bot_stage_seconds Media pipeline stage latency",
+              "# TYPE bot_stage_seconds histogram"]
+    for b in bots:
+        for stage in STAGES:
+            labels = {"bot": b.profile.name, "stage": stage}
+            counts = b.metrics.histograms[stage].total
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(sample("bot_stage_seconds_bucket", {**labels, "le": f"{bound:g}"}, cumulative))
+            lines.append(sample("bot_stage_seconds_bucket", {**labels, "le": "+Inf"}, sum(counts)))
+            lines.append(sample("bot_stage_seconds_sum", labels, f"{b.metrics.sums[stage]:.6f}"))
+            lines.append(sample("bot_stage_seconds_count", labels, sum(counts)))
+    return lines
@@ -0,0 +1,172 @@
+import re
+
+from folding import Folded, fold, is_plain, remove_spans
+
+# ------------------------------------------------------------------------------
+# Numbering markers left behind by earlier forwards:
+#   - a leading "033)." (plus surrounding whitespace) at the start of a line
+#   - a bare "001)." anywhere in the text (001-300)
+# Both are matched by one compiled pattern; the line-start branch is tried first
+# at every position, which is the same order the two separate passes used.
+# ------------------------------------------------------------------------------
+NUMBERING_PATTERN = re.compile(
+    r'^\s*\d+\)\.?\s*'
+    r'|\b(?:0\d{2}|[1-2]\d{2}|300)\)\.',
+    re.MULTILINE,
+)
+
+# ------------------------------------------------------------------------------
+# Build a regex from a character trie of the phrases.
+#
+# A flat "a|b|c|..." alternation makes the regex engine try every phrase at every
+# position, so the cost grows with the phrase list. Factoring the phrases into a
+# trie means each position only follows the branch for its first character, so
+# one pass costs roughly the same for 10 phrases or 1,000.
+#
+# When one phrase is a prefix of another, the longer phrase wins (e.g.
+# "By » Gagan Pratap Sir (Careerwill)" before "By » Gagan Pratap Sir").
+# ------------------------------------------------------------------------------
+def _trie_pattern(phrases) -> str:
+    trie = {}
+    for phrase in phrases:
+        if not phrase:
+            continue
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return _node_pattern(trie)
+
+def _node_pattern(node) -> str:
+    branches = []
+    for ch in sorted(k for k in node if k):
+        branches.append(re.escape(ch) + _node_pattern(node[ch]))
+    terminal = "" in node
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    group = "(?:" + "|".join(branches) + ")"
+    return group + "?" if terminal else group
+
+# ------------------------------------------------------------------------------
+# The phrase list applied as str.replace(phrase, "") for each phrase in order,
+# which is what the bots did, without one pass per phrase.
+#
+# Order matters there: removing one phrase can join its neighbours into an
+# occurrence of a later phrase, and of two overlapping phrases the earlier
+# listed one wins. One scan with the trie regex, resumed one character after
+# each match start so overlapping occurrences are seen, lists the phrases
+# present (the longest match at each position plus the phrases that are
+# prefixes of it). They are then removed in list order, each the way
+# str.replace does it; the phrases listed in between were not present, so
+# replacing them would have changed nothing. A removal can only create a new
+# occurrence across a point where it joined the text, so only a window of the
+# longest phrase's length around each of those is scanned again, and only when
+# the two characters meeting there are next to each other in some phrase.
+# Keeping a superset of the phrases present is enough: replacing one that is
+# no longer there is a no-op, as it was in the loop. A caption holding none of
+# the phrases costs one scan, as before. For lists of up to LOOP_PHRASES
+# phrases this bookkeeping costs more than the loop itself (about 0.25 us per
+# str.replace on a short caption), so once the scan has found a phrase those
+# simply run the loop. python bench.py phrases checks both against the loop.
+# ------------------------------------------------------------------------------
+LOOP_PHRASES = 24
+
+class _ReplaceChain:
+    def __init__(self, phrases):
+        self.phrases = [p for p in phrases if p]
+        indices = {}
+        for i, phrase in enumerate(self.phrases):
+            indices.setdefault(phrase, []).append(i)
+        lengths = sorted({len(p) for p in self.phrases})
+        # every match is a whole phrase; these are the phrases it starts with
+        self._starts_with = {
+            phrase: [i for n in lengths if n <= len(phrase) for i in indices.get(phrase[:n], ())]
+            for phrase in indices
+        }
+        self._reach = lengths[-1] - 1
+        self._pairs = {p[k:k + 2] for p in self.phrases for k in range(len(p) - 1)}
+        self._phrase_re = re.compile(_trie_pattern(self.phrases))
+
+    def _present(self, text: str, pos: int, endpos: int, match=None) -> set:
+        """Indices of the phrases occurring in text[pos:endpos] (from match, the
+        first occurrence, when it is already known)."""
+        found = set()
+        if match is None:
+            match = self._phrase_re.search(text, pos, endpos)
+        while match is not None:
+            found.update(self._starts_with[match.group()])
+            match = self._phrase_re.search(text, match.start() + 1, endpos)
+        return found
+
+    def __call__(self, text: str) -> str:
+        match = self._phrase_re.search(text)
+        if match is None:
+            return text
+        if len(self.phrases) <= LOOP_PHRASES:
+            for phrase in self.phrases:
+                text = text.replace(phrase, "")
+            return text
+        present = self._present(text, 0, len(text), match)
+        while present:
+            i = min(present)
+            phrase = self.phrases[i]
+            parts, joins, start, size = [], [], 0, 0
+            at = text.find(phrase)
+            while at != -1:
+                parts.append(text[start:at])
+                size += at - start
+                joins.append(size)
+                start = at + len(phrase)
+                at = text.find(phrase, start)
+            if joins:
+                parts.append(text[start:])
+                text = "".join(parts)
+                for join in dict.fromkeys(joins):
+                    if 0 < join < len(text) and text[join - 1:join + 1] in self._pairs:
+                        present |= self._present(text, max(0, join - self._reach), join + self._reach)
+            present = {k for k in present if k > i}
+        return text
+
+# ------------------------------------------------------------------------------
+# Phrase stripper: compiled once per phrase list, reused for every caption.
+#   - pass 1: the phrases, with the result of replacing them one after another
+#     (_ReplaceChain)
+#   - pass 2: every numbering marker in a single scan
+# The numbering patterns are anchored to the phrase-free text ("^" and "\b"
+# look at neighbouring characters), so they run as their own fixed pass; the
+# number of passes no longer depends on the number of phrases.
+#
+# With fold=True the phrases and the caption are compared in folded form
+# (folding.py), so restyled variants ("sachin", "𝐒𝐀𝐂𝐇𝐈𝐍", "ꜱᴀᴄʜ𝖎𝖓", zero-width
+# characters inside) all match one configured phrase. Variants that fold to
+# the same text collapse into one trie branch; the caption is folded once, the
+# trie regex still runs once, and the matches are cut out of the original text.
+# As in find_folded(), exact spellings come first: the phrases as configured
+# are removed from the original text (_ReplaceChain). What is left is only
+# folded when it contains characters folding translates, or when its lowercase
+# form still holds a phrase (a case variant); otherwise folding could not
+# match anything. Captions carrying the usual watermark spelled as configured
+# thus pay one extra regex scan, not a fold.
+# ------------------------------------------------------------------------------
+class PhraseStripper:
+    def __init__(self, phrases, strip_numbering: bool = True, fold: bool = False):
+        self.fold = fold
+        self.phrases = list(dict.fromkeys(self._key(p) for p in phrases if p))
+        self.strip_numbering = strip_numbering
+        pattern = _trie_pattern(self.phrases)
+        self._phrase_re = re.compile(pattern) if pattern else None
+        self._exact = _ReplaceChain(phrases) if pattern else None
+
+    def _key(self, phrase: str) -> str:
+        return fold(phrase) if self.fold else phrase
+
+    def __call__(self, text: str) -> str:
+        if self._phrase_re is not None:
+            text = self._exact(text)
+            if self.fold and (not is_plain(text) or self._phrase_re.search(text.lower()) is not None):
+                text = remove_spans(text, Folded(text).spans(self._phrase_re))
+        if self.strip_numbering:
+            text = NUMBERING_PATTERN.sub("", text)
+        return text.strip()
@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+
+from pyrogram import Client, enums
+
+from jsonlog import log
+from scheduler import RETRYABLE_ERRORS
+from styling import format_number
+
+# ------------------------------------------------------------------------------
+# Bulk renumbering of existing channel posts.
+#
+#   /renumber <from_msg_id> <to_msg_id> [start]      (admin command)
+#   python renumber.py --format class_date --chat <id> --from <id> --to <id> [--start N]
+#
+# Messages are fetched with get_messages in batches of up to 200 ids; the next
+# batch is fetched while the current one is being edited. Edits go through the
+# bot's EditScheduler with at most `concurrency` in flight, so the run drains at
+# the rate limits instead of tripping FloodWait.
+#
+# Captions that already carry a number ("[𝟢𝟥𝟥]" in the first line) keep their
+# formatting and only have the number swapped; anything else is rendered from
+# scratch with the bot's caption format.
+#
+# After every batch a JSON checkpoint records the next message id and number.
+# Re-running the same command resumes from there; the checkpoint is removed once
+# the range is done. An edit that still fails after the scheduler's retries
+# (FloodWait, network) stops the run before its batch is checkpointed.
+# ------------------------------------------------------------------------------
+BATCH_SIZE = 200
+CHECKPOINT_DIR = "renumber_checkpoints"
+NUMBER_SLOT = re.compile("\\[([\U0001D7E2-\U0001D7EB]+)\\]")
+
+def parse_number_slot(caption: str):
+    match = NUMBER_SLOT.search(caption.split("\n", 1)[0])
+    if match is None:
+        return None
+    return int("".join(str(ord(ch) - 0x1D7E2) for ch in match.group(1)))
+
+def renumber_caption(caption, num: int, render) -> str:
+    caption = caption or ""
+    html = getattr(caption, "html", None)
+    if html and parse_number_slot(caption) is not None:
+        return NUMBER_SLOT.sub(f"[{format_number(num)}]", html, count=1)
+    return render(caption, num)
+
+class Renumberer:
+    def __init__(self, client, scheduler, render, checkpoint_dir: str = CHECKPOINT_DIR,
+                 batch_size: int = BATCH_SIZE, concurrency: int = 16):
+        self.client = client
+        self.scheduler = scheduler
+        self.render = render
+        self.checkpoint_dir = checkpoint_dir
+        self.batch_size = min(batch_size, BATCH_SIZE)
+        self.concurrency = concurrency
+
+    # --------------------------------------------------------------------------
+    # Checkpoints
+    # --------------------------------------------------------------------------
+    def checkpoint_path(self, chat_id, first_id: int, last_id: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"{chat_id}_{first_id}_{last_id}.json")
+
+    def load_checkpoint(self, chat_id, first_id: int, last_id: int):
+        try:
+            with open(self.checkpoint_path(chat_id, first_id, last_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_checkpoint(self, state: dict):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self.checkpoint_path(state["chat_id"], state["first_id"], state["last_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def clear_checkpoint(self, state: dict):
+        try:
+            os.remove(self.checkpoint_path(state["chat_id"], state["first_id"], state["last_id"]))
+        except OSError:
+            pass
+
+    # --------------------------------------------------------------------------
+    # Pipeline
+    # --------------------------------------------------------------------------
+    async def fetch(self, chat_id, first_id: int, last_id: int):
+        if first_id > last_id:
+            return []
+        ids = list(range(first_id, last_id + 1))
+        messages = await self.scheduler.call(chat_id, self.client.get_messages, chat_id, ids)
+        return [m for m in messages if not m.empty and m.video]
+
+    async def run(self, chat_id, first_id: int, last_id: int, start: int = None, report=None) -> dict:
+        state = self.load_checkpoint(chat_id, first_id, last_id)
+        if state is None:
+            state = {
+                "chat_id": chat_id, "first_id": first_id, "last_id": last_id,
+                "next_id": first_id, "next_number": start, "edited": 0,
+            }
+        elif start is not None and state["next_id"] == first_id:
+            state["next_number"] = start
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def edit(message, num):
+            async with semaphore:
+                caption = renumber_caption(message.caption, num, self.render)
+                await self.scheduler.edit_caption(message, caption, fallback=False)
+
+        started = time.monotonic()
+        edited_before = state["edited"]
+        batch_end = min(state["next_id"] + self.batch_size - 1, last_id)
+        pending = asyncio.ensure_future(self.fetch(chat_id, state["next_id"], batch_end))
+        try:
+            while state["next_id"] <= last_id:
+                videos = await pending
+                next_end = min(batch_end + self.batch_size, last_id)
+                pending = asyncio.ensure_future(self.fetch(chat_id, batch_end + 1, next_end))
+
+                if state["next_number"] is None:
+                    found = next((parse_number_slot(m.caption or "") for m in videos), None)
+                    state["next_number"] = found or 1
+
+                number = state["next_number"]
+                await asyncio.gather(*(edit(m, number + i) for i, m in enumerate(videos)))
+
+                state["next_id"] = batch_end + 1
+                state["next_number"] = number + len(videos)
+                state["edited"] += len(videos)
+                self.save_checkpoint(state)
+                batch_end = next_end
+
+                if report is not None:
+                    elapsed = time.monotonic() - started
+                    rate = (state["edited"] - edited_before) / elapsed if elapsed else 0.0
+                    await report(state, rate)
+        finally:
+            pending.cancel()
+        self.clear_checkpoint(state)
+        return state
+
+# ------------------------------------------------------------------------------
+# /renumber command
+# ------------------------------------------------------------------------------
+RENUMBER_USAGE = (
+    "❌ <b>Usage:</b> <code>/renumber &lt;from_msg_id&gt; &lt;to_msg_id&gt; [start]</code>\n"
+    "Example: <code>/renumber 120 480 51</code>"
+)
+
+async def is_admin(client, message) -> bool:
+    if message.chat.type in (enums.ChatType.CHANNEL, enums.ChatType.PRIVATE):
+        return True
+    if message.sender_chat and message.sender_chat.id == message.chat.id:
+        return True
+    if not message.from_user:
+        return False
+    member = await client.get_chat_member(message.chat.id, message.from_user.id)
+    return member.status in (enums.ChatMemberStatus.ADMINISTRATOR, enums.ChatMemberStatus.OWNER)
+
+async def renumber_command(client, message, media):
+    scheduler = media.scheduler
+    try:
+        args = [int(arg) for arg in message.command[1:]]
+        if len(args) not in (2, 3) or args[0] < 1 or args[1] < args[0] or (len(args) == 3 and args[2] < 1):
+            raise ValueError
+    except ValueError:
+        await scheduler.reply(message, RENUMBER_USAGE, parse_mode=enums.ParseMode.HTML)
+        return
+    if not await is_admin(client, message):
+        await scheduler.reply(message, "❌ Only chat admins can renumber posts.")
+        return
+
+    first_id, last_id = args[0], args[1]
+    start = args[2] if len(args) == 3 else None
+    chat_id = message.chat.id
+    status = await scheduler.reply(message, f"⏳ Renumbering messages {first_id}-{last_id}…")
+
+    async def report(state, rate):
+        text = (f"⏳ Renumbering messages {first_id}-{last_id}: up to #{state['next_id'] - 1}, "
+                f"{state['edited']} videos, {rate:.1f} msg/s")
+        log.info("renumber_progress", chat_id=chat_id, message_id=state["next_id"] - 1,
+                 edited=state["edited"], rate=round(rate, 1))
+        if status is not None:
+            await scheduler.call(chat_id, status.edit_text, text)
+
+    renumberer = Renumberer(client, scheduler, media.render_for(chat_id))
+    try:
+        state = await renumberer.run(chat_id, first_id, last_id, start, report)
+    except RETRYABLE_ERRORS as e:
+        log.error("renumber_stopped", chat_id=chat_id, outcome="error", error=str(e), error_type=type(e).__name__)
+        await scheduler.reply(message, f"❌ Renumbering stopped ({type(e).__name__}); "
+                                       f"send the same command again to resume.")
+        return
+    await scheduler.reply(
+        message,
+        f"✅ Renumbered {state['edited']} videos. The next number after this range is "
+        f"{format_number(state['next_number'])}; use <code>/set {state['next_number']}</code> "
+        f"if new uploads should continue from there.",
+        parse_mode=enums.ParseMode.HTML,
+    )
+
+# ------------------------------------------------------------------------------
+# Offline CLI
+# ------------------------------------------------------------------------------
+async def main_async(args):
+    from classifier import AUTO, FormatClassifier
+    from rules import RuleError, load_rules
+    from scheduler import EditScheduler
+
+    rules = load_rules(args.rules)
+    if args.format == AUTO:
+        render = FormatClassifier(rules, args.default_format).render
+    elif args.format in rules:
+        render = rules[args.format].render
+    else:
+        raise RuleError(f"❌ No caption rule {args.format!r} in {args.rules} (known: {', '.join(sorted(rules))})")
+
+    client = Client(args.session, bot_token=os.getenv("BOT_TOKEN", ""),
+                    api_id=int(os.getenv("API_ID", "0")), api_hash=os.getenv("API_HASH", ""))
+
+    async def report(state, rate):
+        print(f"up to #{state['next_id'] - 1}: {state['edited']} videos, {rate:.1f} msg/s")
+
+    async with client:
+        renumberer = Renumberer(client, EditScheduler(), render,
+                                batch_size=args.batch_size, concurrency=args.concurrency)
+        state = await renumberer.run(args.chat, args.first, args.last, args.start, report)
+    print(f"Done: {state['edited']} videos renumbered, next number {state['next_number']}")
+
+def main():
+    from rules import RULES_FILE
+
+    parser = argparse.ArgumentParser(description="Renumber existing video captions in a channel")
+    parser.add_argument("--format", required=True, help="caption format of the bot (a rule in --rules, or auto)")
+    parser.add_argument("--default-format", default="plain", help="format for unrecognised captions with --format auto")
+    parser.add_argument("--rules", default=RULES_FILE, help="caption rules file")
+    parser.add_argument("--chat", required=True, type=int, help="chat id, e.g. -1001234567890")
+    parser.add_argument("--from", dest="first", required=True, type=int, help="first message id")
+    parser.add_argument("--to", dest="last", required=True, type=int, help="last message id")
+    parser.add_argument("--start", type=int, default=None, help="number for the first video (default: keep the existing one)")
+    parser.add_argument("--session", default="renumber_cli", help="pyrogram session name")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+import os
+import re
+import tomllib
+from collections import OrderedDict
+from itertools import islice
+from string import Formatter
+
+from folding import find_folded, fold
+from phrases import PhraseStripper
+from styling import TABLES, format_number
+
+# ------------------------------------------------------------------------------
+# Declarative caption rules (rules.toml), compiled once into render functions.
+#
+# A rule turns a caption and a number into the final HTML caption:
+#
+#   <blockquote>{block}</blockquote>\n{body}
+#
+#   pre        ops applied to the whole caption first; the result is {text}
+#   markers    a chain of required markers, each searched from the start of the
+#              previous one; if any is missing the fallback layout is used
+#   fields     named values, evaluated in order (see below); {number} is the
+#              styled number and {text} the pre-processed caption
+#   block      template for the blockquoted line
+#   body       template for what follows it (default "")
+#   fallback   { block = ..., body = ... } used when a marker is missing
+#              (default: block "[{number}]", body "{text}")
+#   omit_empty_body   leave out the newline when the body is empty
+#   signature  marker, or list of markers found one after the other, that
+#              recognises captions in this format, for bots with
+#              format = "auto" (classifier.py)
+#
+# A field is either a constant (`value`) or a slice of `source` (default
+# "text", or an earlier field):
+#
+#   from / to       end / start of a chain marker (text fields only)
+#   after / before  a marker searched in the whole source; a missing marker
+#                   makes the field empty unless it is `optional`, in which
+#                   case the slice runs from the start / to the end
+#   either          list of alternative slices; the first whose markers are
+#                   all found is used
+#   ops             pipeline applied to the slice
+#
+# Markers: { find = "literal", ignore_case = false, fold = false } or
+#          { regex = "pattern", nth = 1 }, plus `optional` for after/before.
+# A case-insensitive find searches text.lower(), like the hand-written code.
+# A folded find (folding.py) also ignores styling and zero-width characters;
+# the text is only folded when the exact spelling is missing, and slices still
+# come from the original.
+#
+# Ops: "strip", "squash" (collapse whitespace), { remove = "x" | ["x", ...] },
+#      { sub = ["pattern", "replacement"] }, { style = "sans" },
+#      { strip_phrases = [...], fold = false } (phrases.PhraseStripper).
+# A sub replacement must only refer to groups its pattern has, and every rule
+# must render an empty and a sample caption at load time, so a rules file that
+# would fail on each caption is rejected (and not hot-reloaded) instead.
+#
+# Each rule is compiled at load time into a single Python function, generated
+# from the rule the way the hand-written version would be written: finds and
+# slices on locals, ops chained as method calls, the caption concatenated in
+# one expression. Strings, regexes and translate tables from the file are bound
+# as constants of that function (never pasted into its source), and field names
+# only become generated local names, so a rules file cannot inject code.
+# CaptionRule.source keeps the generated code for inspection; hot paths call
+# CaptionRule.render, the generated function itself.
+#
+# Channels re-post the same caption bodies over and over, and only the number
+# differs between them. Each rule is also generated as template(caption,
+# number), which takes the styled number as given, and the bots render through
+# CaptionRule.cache: an LRU of template(caption, SLOT) split at SLOT, so a hit
+# is one dict lookup plus joining in format_number(num). The key is the exact
+# caption (hashed by the dict): any normalisation the rule does not apply
+# itself could change the output. The cache belongs to the compiled rule, so
+# recompiling a rules file starts from an empty one. Rules that use {number}
+# as a field source, or whose constants contain SLOT, are not cached.
+# ------------------------------------------------------------------------------
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.toml")
+SLOT = "\x00"
+CACHE_SIZE = 1024
+
+class RuleError(ValueError):
+    pass
+
+TOML_TYPES = {str: "a string", int: "an integer", bool: "a boolean", list: "an array", dict: "a table"}
+
+def expect(value, kind, what: str):
+    """Return value if it has the TOML type kind, else raise RuleError."""
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise RuleError(f"{what} must be {TOML_TYPES[kind]}, not {value!r}")
+    return value
+
+def expect_list(value, kind, what: str) -> list:
+    """Return value if it is an array of kind, else raise RuleError."""
+    for item in expect(value, list, what):
+        expect(item, kind, f"each entry of {what}")
+    return value
+
+def check_replacement(pattern, replacement: str):
+    """Raise re.error unless replacement is a valid re.sub template for pattern.
+    re only resolves group references when a match is substituted, so the
+    template is expanded against an empty match with the same groups."""
+    names = {index: name for name, index in pattern.groupindex.items()}
+    groups = "".join(f"(?P<{names[i]}>)" if i in names else "()" for i in range(1, pattern.groups + 1))
+    re.compile(groups).match("").expand(replacement)
+
+def nth_span(pattern, text: str, nth: int, start: int = 0):
+    match = next(islice(pattern.finditer(text, start), nth - 1, None), None)
+    return match.span() if match else None
+
+# ------------------------------------------------------------------------------
+# Render cache
+# ------------------------------------------------------------------------------
+class RenderCache:
+    """LRU of one rule's rendered captions with the number slots left open."""
+
+    def __init__(self, template, render, capacity: int = CACHE_SIZE):
+        self.template = template
+        self.fallback = render
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def render(self, caption: str, num: int) -> str:
+        parts = self._entries.get(caption)
+        if parts is not None:
+            self.hits += 1
+            self._entries.move_to_end(caption)
+            return format_number(num).join(parts)
+        self.misses += 1
+        if SLOT in caption:
+            return self.fallback(caption, num)
+        parts = self._entries[caption] = tuple(self.template(caption, SLOT).split(SLOT))
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return format_number(num).join(parts)
+
+    def clear(self):
+        self._entries.clear()
+
+# ------------------------------------------------------------------------------
+# Code generation
+# ------------------------------------------------------------------------------
+class CaptionRule:
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.signature = spec.get("signature")
+        if isinstance(self.signature, dict):
+            self.signature = [self.signature]
+        for marker in expect_list(self.signature or [], dict, "signature"):
+            if "find" not in marker and "regex" not in marker:
+                raise RuleError(f"signature marker needs `find` or `regex`: {marker!r}")
+            if marker.get("fold"):
+                raise RuleError(f"`fold` is not supported in signatures: {marker!r}")
+            for key in ("find", "regex"):
+                if key in marker:
+                    expect(marker[key], str, f"signature {key}")
+            if "regex" in marker:
+                re.compile(marker["regex"])
+        self._constants = {"format_number": format_number, "nth_span": nth_span, "find_folded": find_folded}
+        self._lines = []
+        self._locals = 0
+
+        pre = "caption"
+        for op in expect(spec.get("pre", []), list, "pre"):
+            pre = self._op(op, pre)
+        self._emit(1, f"text = {pre}")
+        self._emit(1, "number = format_number(num)")
+
+        fallback = expect(spec.get("fallback", {}), dict, "fallback")
+        basic = {"text": (True, "text"), "number": (True, "number")}
+        fallback_block = self._template(fallback.get("block", "[{number}]"), basic)
+        fallback_body = self._template(fallback.get("body", "{text}"), basic)
+        omit_empty_body = expect(spec.get("omit_empty_body", False), bool, "omit_empty_body")
+
+        # Marker chain: each searched from the start of the previous one
+        chain = {}
+        start = "0"
+        for marker in expect_list(spec.get("markers", []), dict, "markers"):
+            expect(marker.get("name"), str, "marker name")
+            hit = self._local()
+            search, found, missing, begin, end = self._find(marker, "text", start, hit)
+            self._emit(1, f"if ({hit} := {search}){missing}:")
+            self._emit_return(2, fallback_block, fallback_body, omit_empty_body)
+            chain[marker["name"]] = (begin, end)
+            start = begin
+
+        # Fields; constant ones are folded into the templates as literals
+        names = dict(basic)
+        cacheable = True
+        for field_name, field in expect(spec.get("fields", {}), dict, "fields").items():
+            expect(field, dict, f"field {field_name!r}")
+            if "value" in field:
+                value = expect(field["value"], str, f"field {field_name!r} value")
+                for op in expect(field.get("ops", []), list, f"field {field_name!r} ops"):
+                    value = self._call_op(op, value)
+                names[field_name] = (False, value)
+                continue
+            source = expect(field.get("source", "text"), str, f"field {field_name!r} source")
+            if source not in names or not names[source][0]:
+                raise RuleError(f"field {field_name!r}: unknown source {source!r}")
+            if names[source][1] == "number":
+                cacheable = False
+            var = self._local()
+            self._field(var, names[source][1], field, chain if source == "text" else {})
+            names[field_name] = (True, var)
+
+        self._emit_return(1, self._template(expect(spec.get("block"), str, "block"), names),
+                          self._template(spec.get("body", ""), names), omit_empty_body)
+        self.source = "def render(caption, num):\n" + "\n".join(self._lines) + "\n"
+        namespace = dict(self._constants)
+        exec(compile(self.source, f"<rule {name}>", "exec"), namespace)
+        self.render = namespace["render"]
+
+        if any(isinstance(value, str) and SLOT in value for value in self._constants.values()):
+            cacheable = False
+        self.cache = None
+        if cacheable:
+            template_source = "def template(caption, number):\n" + "\n".join(self._lines[:1] + self._lines[2:]) + "\n"
+            exec(compile(template_source, f"<rule {name} template>", "exec"), namespace)
+            self.cache = RenderCache(namespace["template"], self.render)
+        self.cached_render = self.cache.render if self.cache is not None else self.render
+
+    def __call__(self, caption: str, num: int) -> str:
+        return self.render(caption, num)
+
+    # --------------------------------------------------------------------------
+    # Helpers
+    # --------------------------------------------------------------------------
+    def _emit(self, depth: int, line: str):
+        self._lines.append("    " * depth + line)
+
+    def _const(self, value) -> str:
+        name = f"c{len(self._constants)}"
+        self._constants[name] = value
+        return name
+
+    def _local(self) -> str:
+        self._locals += 1
+        return f"v{self._locals}"
+
+    def _op(self, op, expr: str) -> str:
+        if op == "strip":
+            return f"{expr}.strip()"
+        if op == "squash":
+            return f"{self._const(' ')}.join({expr}.split())"
+        if isinstance(op, dict) and len(op) == 1:
+            (name, arg), = op.items()
+            if name == "remove":
+                for literal in ([arg] if isinstance(arg, str) else expect_list(arg, str, "remove")):
+                    expr = f"{expr}.replace({self._const(literal)}, {self._const('')})"
+                return expr
+            if name == "sub":
+                pattern, replacement = expect_list(arg, str, "sub")
+                pattern = re.compile(pattern)
+                check_replacement(pattern, replacement)
+                return f"{self._const(pattern)}.sub({self._const(replacement)}, {expr})"
+            if name == "style":
+                if not isinstance(arg, str) or arg not in TABLES:
+                    raise RuleError(f"unknown style {arg!r} (known: {', '.join(TABLES)})")
+                return f"{expr}.translate({self._const(TABLES[arg])})"
+        if isinstance(op, dict) and "strip_phrases" in op and set(op) <= {"strip_phrases", "fold"}:
+            phrases = expect_list(op["strip_phrases"], str, "strip_phrases")
+            fold_phrases = expect(op.get("fold", False), bool, "strip_phrases fold")
+            return f"{self._const(PhraseStripper(phrases, fold=fold_phrases))}({expr})"
+        raise RuleError(f"unknown op {op!r}")
+
+    def _call_op(self, op, value: str) -> str:
+        expr = self._op(op, "value")
+        return eval(expr, dict(self._constants), {"value": value})
+
+    def _find(self, marker: dict, source: str, start: str, hit: str):
+        """Search for marker in source; return (search expression, found test, missing test, start, end)
+        where the tests and bounds refer to the search result stored in hit."""
+        expect(marker, dict, "marker")
+        for key, kind in (("find", str), ("regex", str), ("nth", int), ("ignore_case", bool), ("fold", bool),
+                          ("optional", bool)):
+            if key in marker:
+                expect(marker[key], kind, f"marker {key}")
+        if marker.get("fold"):
+            if "find" not in marker:
+                raise RuleError(f"`fold` only applies to `find` markers: {marker!r}")
+            needle = marker["find"]
+            search = f"find_folded({source}, {self._const(needle)}, {self._const(fold(needle))}, {start})"
+            return search, " is not None", " is None", f"{hit}[0]", f"{hit}[1]"
+        if "find" in marker:
+            needle = marker["find"]
+            haystack = source
+            if marker.get("ignore_case"):
+                needle = needle.lower()
+                haystack = f"{source}.lower()"
+            search = f"{haystack}.find({self._const(needle)}, {start})"
+            return search, " != -1", " == -1", hit, f"{hit} + {len(marker['find'])}"
+        if "regex" in marker:
+            pattern = self._const(re.compile(marker["regex"]))
+            search = f"nth_span({pattern}, {source}, {int(marker.get('nth', 1))}, {start})"
+            return search, " is not None", " is None", f"{hit}[0]", f"{hit}[1]"
+        raise RuleError(f"marker needs `find` or `regex`: {marker!r}")
+
+    def _field(self, var: str, source: str, field: dict, chain: dict):
+        """Emit the code assigning field to var: an if/elif chain over the alternatives,
+        each guarded by its required markers, ending in "" if none matches."""
+        ops = expect(field.get("ops", []), list, "ops")
+        branch = "if"
+        for alt in expect_list(field.get("either", [field]), dict, "either"):
+            start, end = "", ""
+            for key, index in (("from", 1), ("to", 0)):
+                if key in alt:
+                    if not isinstance(alt[key], str) or alt[key] not in chain:
+                        raise RuleError(f"unknown marker {alt[key]!r}")
+                    if key == "from":
+                        start = chain[alt[key]][index]
+                    else:
+                        end = chain[alt[key]][index]
+
+            conditions, lines = [], []
+            for key in ("after", "before"):
+                if key not in alt:
+                    continue
+                marker = alt[key]
+                hit = self._local()
+                search, found, missing, begin, finish = self._find(marker, source, "0", hit)
+                bound = finish if key == "after" else begin
+                if marker.get("optional"):
+                    fallback = (start or "0") if key == "after" else (end or f"len({source})")
+                    lines.append(f"{hit} = {search}")
+                    bound = f"({bound} if {hit}{found} else {fallback})"
+                else:
+                    conditions.append(f"({hit} := {search}){found}")
+                if key == "after":
+                    start = bound
+                else:
+                    end = bound
+
+            value = f"{source}[{start}:{end}]" if start or end else source
+            for op in ops:
+                value = self._op(op, value)
+            lines.append(f"{var} = {value}")
+
+            if conditions:
+                self._emit(1, f"{branch} {' and '.join(conditions)}:")
+                depth = 2
+                branch = "elif"
+            elif branch == "if":
+                depth = 1
+            else:
+                self._emit(1, "else:")
+                depth = 2
+            for line in lines:
+                self._emit(depth, line)
+            if not conditions:
+                return
+        self._emit(1, "else:")
+        self._emit(2, f"{var} = {self._const('')}")
+
+    def _template(self, template: str, names: dict) -> list:
+        """Parse a template into [(is_variable, literal or local name), ...]."""
+        expect(template, str, "template")
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if literal:
+                parts.append((False, literal))
+            if field is not None:
+                if spec or conversion or field not in names:
+                    raise RuleError(f"bad placeholder {{{field}}} in {template!r}")
+                parts.append(names[field])
+        return parts
+
+    def _concat(self, parts: list) -> str:
+        """Expression joining template parts, with adjacent literals merged into one constant."""
+        terms = []
+        literal = ""
+        for is_variable, value in parts:
+            if not is_variable:
+                literal += value
+                continue
+            if literal:
+                terms.append(self._const(literal))
+                literal = ""
+            terms.append(value)
+        if literal or not terms:
+            terms.append(self._const(literal))
+        if len(terms) == 1:
+            return terms[0]
+        # One f-string builds the result in a single allocation, unlike a chain of +
+        return 'f"' + "".join(f"{{{term}}}" for term in terms) + '"'
+
+    def _emit_return(self, depth: int, block: list, body: list, omit_empty_body: bool):
+        head = [(False, "<blockquote>")] + block + [(False, "</blockquote>")]
+        if not omit_empty_body:
+            self._emit(depth, f"return {self._concat(head + [(False, chr(10))] + body)}")
+            return
+        self._emit(depth, f"body = {self._concat(body)}")
+        self._emit(depth, "if body:")
+        self._emit(depth + 1, f"return {self._concat(head + [(False, chr(10)), (True, 'body')])}")
+        self._emit(depth, f"return {self._concat(head)}")
+
+def sample_caption(rule: CaptionRule) -> str:
+    """A caption the rule recognises, pieced together from its signature."""
+    parts = [marker["find"] for marker in rule.signature or [] if "find" in marker]
+    return " ".join(["Sample", *parts, "12 March 2024 sample (x) // sample.mkv"])
+
+def compile_rules(config: dict) -> dict:
+    """Compile every rule, then render a sample caption with each, so a rule
+    that compiles but fails at render time is rejected here rather than by
+    every caption once it is in use."""
+    rules = {}
+    for name, spec in expect(config.get("rules", {}), dict, "rules").items():
+        try:
+            rule = rules[name] = CaptionRule(name, expect(spec, dict, "a rule"))
+            for caption in ("", sample_caption(rule)):
+                rule.render(caption, 1)
+                rule.cached_render(caption, 1)
+        except Exception as e:
+            raise RuleError(f"rule {name!r}: {e}") from e
+    return rules
+
+def load_rules(path: str = RULES_FILE) -> dict:
+    """Compile every rule in a TOML file into render(caption, num) callables."""
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    try:
+        return compile_rules(config)
+    except RuleError as e:
+        raise RuleError(f"❌ {path}: {e}") from e
@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+from jsonlog import log
+from rules import load_rules
+
+# ------------------------------------------------------------------------------
+# Hot reload of caption rules files.
+#
+# Every `interval` seconds each watched rules file is stat()ed; a change of
+# mtime, size or inode (editors often write a new file and rename it over the
+# old one) triggers a reload. The file is compiled in a worker thread, so the
+# event loop keeps handling updates meanwhile, and the result is handed to
+# on_change(path, rules), which validates it against the bots using the file
+# and swaps it in. A file that does not parse or compile, or that on_change
+# rejects (ValueError), is reported and the current rules stay in use; the
+# next change is tried again. A file caught half-written fails to parse and is
+# retried once its stat changes again. Any other error while reloading is
+# reported the same way, so one bad save never stops the watcher.
+# ------------------------------------------------------------------------------
+class RulesWatcher:
+    def __init__(self, paths: list, on_change, interval: float = 2.0):
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self.reloads = 0
+        self.rejected = 0
+        self._stats = {path: self._stat(path) for path in self.paths}
+        self._task = None
+
+    @staticmethod
+    def _stat(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for path in self.paths:
+                stat = self._stat(path)
+                if stat is None or stat == self._stats[path]:
+                    continue
+                self._stats[path] = stat
+                try:
+                    await self.reload(path)
+                except Exception as e:
+                    self.rejected += 1
+                    log.error("rules_rejected", path=path, outcome="kept_current", error=str(e),
+                              error_type=type(e).__name__)
+
+    async def reload(self, path: str):
+        try:
+            rules = await asyncio.to_thread(load_rules, path)
+            self.on_change(path, rules)
+        except (OSError, ValueError) as e:
+            self.rejected += 1
+            log.error("rules_rejected", path=path, outcome="kept_current", error=str(e), error_type=type(e).__name__)
+            return
+        self.reloads += 1
+        log.info("rules_reloaded", path=path, rules=list(rules), outcome="ok")
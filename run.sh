@@ -1,4 +1,3 @@
 #!/bin/sh
-python bot.py &
-python bot2.py &
-wait
+# All bots listed in bots.toml run in one process (see host.py).
+exec python host.py "$@"
@@ -0,0 +1,236 @@
+import asyncio
+import html
+import random
+import re
+import time
+
+from pyrogram import enums, raw
+from pyrogram.errors import FloodWait, InternalServerError, MessageNotModified
+from pyrogram.parser.html import HTML
+
+from jsonlog import log
+from metrics import Metrics
+
+# ------------------------------------------------------------------------------
+# Token bucket: `rate` calls per second on average, bursts of up to `burst`.
+# Waiters are served in FIFO order (one asyncio.Lock per bucket), and a bucket
+# can be blocked for a server-provided FloodWait duration.
+# ------------------------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+# ------------------------------------------------------------------------------
+# No-op edit detection.
+#
+# An edit that would leave a caption as it is still costs a rate-limit token
+# and a round trip before Telegram answers MESSAGE_NOT_MODIFIED: a PDF that
+# has no caption to clear, a post that was already processed (redelivered,
+# caught up or renumbered to the same number). The new HTML caption is parsed
+# the way pyrogram sends it and compared with the message's current text and
+# entities; the order entities are listed in does not matter, anything else
+# (text, type, range, url, language, custom emoji, collapsed) does. Entities
+# Telegram derives from the text itself (@mentions, links, hashtags, ...) are
+# left out, since equal text gives equal ones; captions mentioning a user by
+# id are never treated as unchanged. Most edits do change the text, so the
+# text with tags stripped is compared first and the HTML is only parsed when
+# it matches.
+# ------------------------------------------------------------------------------
+_html = HTML(None)
+_TAG = re.compile(r"<[^>]*>")
+_AUTO_ENTITIES = {
+    enums.MessageEntityType.MENTION, enums.MessageEntityType.HASHTAG, enums.MessageEntityType.CASHTAG,
+    enums.MessageEntityType.BOT_COMMAND, enums.MessageEntityType.URL, enums.MessageEntityType.EMAIL,
+    enums.MessageEntityType.PHONE_NUMBER, enums.MessageEntityType.BANK_CARD,
+}
+
+def _entity_key(entity_type, entity) -> tuple:
+    return (entity_type, entity.offset, entity.length, getattr(entity, "url", None),
+            getattr(entity, "language", None) or None,
+            getattr(entity, "custom_emoji_id", getattr(entity, "document_id", None)),
+            bool(getattr(entity, "collapsed", None)))
+
+async def caption_unchanged(message, caption: str) -> bool:
+    """True if editing message's caption to the HTML caption would change nothing."""
+    current = message.caption or ""
+    if not caption or not current:
+        return not caption and not current
+    if html.unescape(_TAG.sub("", caption)).strip() != current.strip():
+        return False
+    parsed = await _html.parse(caption)
+    if parsed["message"] != str(current):
+        return False
+    new = []
+    for entity in parsed["entities"] or ():
+        if isinstance(entity, raw.types.InputMessageEntityMentionName):
+            return False
+        entity_type = enums.MessageEntityType(entity.__class__)
+        if entity_type not in _AUTO_ENTITIES:
+            new.append(_entity_key(entity_type, entity))
+    old = []
+    for entity in message.caption_entities or ():
+        if entity.type == enums.MessageEntityType.TEXT_MENTION:
+            return False
+        if entity.type not in _AUTO_ENTITIES:
+            old.append(_entity_key(entity.type, entity))
+    return sorted(new, key=repr) == sorted(old, key=repr)
+
+# ------------------------------------------------------------------------------
+# Outbound scheduler: every caption edit and reply goes through call().
+#
+#   - each call takes a token from its chat's bucket, then from the global one;
+#   - FloodWait blocks that chat's bucket for the server-provided duration (plus
+#     jitter) and the call is retried, instead of falling back to a re-upload;
+#   - transient server/network errors are retried with jittered backoff;
+#   - anything else is raised to the caller.
+#
+# The defaults follow Telegram's published bot limits (about 30 requests per
+# second overall and about 20 messages per minute in one group or channel).
+# `depth` is the number of calls queued or in flight, so a burst of forwarded
+# videos shows up as a draining queue instead of a wall of errors. `last_edit`
+# is the monotonic time of the last caption edit Telegram accepted. Token
+# waits, edit and fallback latencies and their outcomes go to `metrics`;
+# caption edits that would change nothing are skipped before taking a token
+# and counted as edits_skipped. Retries and failed edits are logged through
+# jsonlog with the bot `name`, chat, message, latency and outcome (each edit's
+# outcome at debug level).
+# ------------------------------------------------------------------------------
+TRANSIENT_ERRORS = (InternalServerError, OSError, asyncio.TimeoutError)
+RETRYABLE_ERRORS = (FloodWait,) + TRANSIENT_ERRORS
+
+class EditScheduler:
+    def __init__(self, chat_rate: float = 20 / 60, chat_burst: int = 20,
+                 global_rate: float = 30.0, global_burst: int = 30,
+                 max_retries: int = 5, jitter: float = 0.5, metrics: Metrics = None, name: str = None):
+        self.name = name
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_retries = max_retries
+        self.jitter = jitter
+        self.depth = 0
+        self.chat_depth = {}
+        self.flood_waits = 0
+        self.last_edit = None
+        self.metrics = metrics or Metrics()
+        self._chat_buckets = {}
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def call(self, chat_id, fn, *args, **kwargs):
+        bucket = self._bucket(chat_id)
+        self.depth += 1
+        self.chat_depth[chat_id] = self.chat_depth.get(chat_id, 0) + 1
+        try:
+            attempt = 0
+            while True:
+                with self.metrics.time("queue_wait"):
+                    await bucket.acquire()
+                    await self.global_bucket.acquire()
+                try:
+                    return await fn(*args, **kwargs)
+                except FloodWait as e:
+                    attempt += 1
+                    self.flood_waits += 1
+                    if attempt > self.max_retries:
+                        raise
+                    wait = float(e.value) + random.uniform(0, self.jitter)
+                    log.warning("flood_wait", bot=self.name, chat_id=chat_id, stage="queue_wait",
+                                wait=round(wait, 1), attempt=attempt, outcome="retry", error_type="FloodWait")
+                    bucket.block(wait)
+                except TRANSIENT_ERRORS as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+                    backoff = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                    log.warning("transient_error", bot=self.name, chat_id=chat_id, backoff=round(backoff, 1),
+                                attempt=attempt, outcome="retry", error=str(e), error_type=type(e).__name__)
+                    await asyncio.sleep(backoff)
+        finally:
+            self.depth -= 1
+            self.chat_depth[chat_id] -= 1
+            if not self.chat_depth[chat_id]:
+                del self.chat_depth[chat_id]
+
+    # --------------------------------------------------------------------------
+    # Convenience wrappers used by the handlers
+    # --------------------------------------------------------------------------
+    async def reply(self, message, text: str, **kwargs):
+        return await self.call(message.chat.id, message.reply, text, **kwargs)
+
+    async def edit_caption(self, message, caption: str, fallback: bool = True):
+        """
+        Edit the caption of a video or PDF message. If Telegram refuses the
+        edit (for anything but rate limiting or an unchanged caption), re-post
+        the file with the new caption when fallback is set. FloodWait and
+        transient errors that outlast the retries are raised: the edit was not
+        refused, so it is left for the caller to retry rather than re-posted.
+        """
+        chat_id = message.chat.id
+        context = {"bot": self.name, "chat_id": chat_id, "message_id": message.id, "stage": "edit"}
+        if await caption_unchanged(message, caption):
+            self.metrics.inc("edits_skipped")
+            log.debug("edit", **context, outcome="unchanged")
+            return None
+        start = time.perf_counter()
+        try:
+            with self.metrics.time("edit"):
+                result = await self.call(chat_id, message.edit_caption, caption, parse_mode=enums.ParseMode.HTML)
+            self.last_edit = time.monotonic()
+            self.metrics.inc("edits")
+            log.debug("edit", **context, latency=round(time.perf_counter() - start, 4), outcome="ok")
+            return result
+        except MessageNotModified:
+            self.last_edit = time.monotonic()
+            log.debug("edit", **context, latency=round(time.perf_counter() - start, 4), outcome="not_modified")
+            return None
+        except RETRYABLE_ERRORS as e:
+            self.metrics.inc("edit_errors")
+            log.error("edit_failed", **context, latency=round(time.perf_counter() - start, 4),
+                      outcome="gave_up", error=str(e), error_type=type(e).__name__)
+            raise
+        except Exception as e:
+            self.metrics.inc("edit_errors")
+            log.error("edit_failed", **context, latency=round(time.perf_counter() - start, 4),
+                      outcome="fallback" if fallback else "error", error=str(e), error_type=type(e).__name__)
+            if not fallback:
+                return None
+        if message.video:
+            reply, file_id = message.reply_video, message.video.file_id
+        elif message.document:
+            reply, file_id = message.reply_document, message.document.file_id
+        else:
+            return None
+        start = time.perf_counter()
+        with self.metrics.time("fallback"):
+            result = await self.call(chat_id, reply, file_id, caption=caption, parse_mode=enums.ParseMode.HTML)
+        self.metrics.inc("fallbacks")
+        log.debug("edit", **{**context, "stage": "fallback"}, latency=round(time.perf_counter() - start, 4), outcome="ok")
+        return result
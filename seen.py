@@ -0,0 +1,114 @@
+import atexit
+import mmap
+import os
+import struct
+
+from jsonlog import log
+
+# ------------------------------------------------------------------------------
+# Persistent, bounded record of processed (chat_id, message_id) pairs.
+#
+# After a reconnect or restart Telegram can deliver an update again; numbering
+# it a second time would shift every later number by one. MediaHandler calls
+# add() before reserving a number and skips the message when it was seen.
+#
+# The record is an exact window of the last `capacity` pairs:
+#   - on disk, a fixed-size ring of 16-byte slots (chat_id, message_id as two
+#     int64) behind a small header, memory-mapped so that recording a pair is
+#     a couple of memory writes, with no syscall on the event loop. Writes land
+#     in the page cache immediately, so they survive a process crash; msync
+#     happens on close;
+#   - in memory, a set of the same pairs packed into one int each for O(1)
+#     lookups. The oldest pair is evicted when its slot is reused, so both the
+#     file and the set stay the same size however long the bot runs.
+#
+# Reopening with a different capacity keeps the most recent pairs.
+# ------------------------------------------------------------------------------
+MAGIC = b"SEEN"
+HEADER = struct.Struct("<4sII")
+HEADER_SIZE = 16
+SLOT = struct.Struct("<qq")
+
+class SeenSet:
+    def __init__(self, path: str, capacity: int = 65536):
+        self.path = path
+        self.capacity = capacity
+        self._keys = set()
+        self._next = 0
+        self._file = None
+        self._mm = None
+        self._closed = False
+        self._open()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _key(chat_id: int, message_id: int) -> int:
+        return (chat_id << 32) | message_id
+
+    def __contains__(self, pair) -> bool:
+        return self._key(*pair) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, chat_id: int, message_id: int) -> bool:
+        """Record the pair; return False if it was already recorded."""
+        key = self._key(chat_id, message_id)
+        if key in self._keys:
+            return False
+        offset = HEADER_SIZE + self._next * SLOT.size
+        old_chat, old_message = SLOT.unpack_from(self._mm, offset)
+        if old_message:
+            self._keys.discard(self._key(old_chat, old_message))
+        SLOT.pack_into(self._mm, offset, chat_id, message_id)
+        self._next = (self._next + 1) % self.capacity
+        HEADER.pack_into(self._mm, 0, MAGIC, self.capacity, self._next)
+        self._keys.add(key)
+        return True
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+
+    # --------------------------------------------------------------------------
+    # Loading
+    # --------------------------------------------------------------------------
+    def _read_pairs(self):
+        """Return (capacity, pairs oldest first) from an existing file, or (None, [])."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None, []
+        if len(data) < HEADER_SIZE:
+            return None, []
+        magic, capacity, next_slot = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or not capacity or next_slot >= capacity or len(data) != HEADER_SIZE + capacity * SLOT.size:
+            log.warning("seen_file_invalid", path=self.path)
+            return None, []
+        order = list(range(next_slot, capacity)) + list(range(next_slot))
+        pairs = [SLOT.unpack_from(data, HEADER_SIZE + i * SLOT.size) for i in order]
+        return capacity, [pair for pair in pairs if pair[1]]
+
+    def _open(self):
+        capacity, pairs = self._read_pairs()
+        if capacity != self.capacity:
+            pairs = pairs[-self.capacity:]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, self.capacity, len(pairs) % self.capacity).ljust(HEADER_SIZE, b"\0"))
+                for pair in pairs:
+                    f.write(SLOT.pack(*pair))
+                f.write(bytes((self.capacity - len(pairs)) * SLOT.size))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+        self._file = open(self.path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._next = HEADER.unpack_from(self._mm, 0)[2]
+        self._keys = {self._key(*pair) for pair in pairs}
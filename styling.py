@@ -0,0 +1,73 @@
+# ------------------------------------------------------------------------------
+# Unicode "font" styling via precomputed str.translate tables.
+#
+# Each Mathematical Alphanumeric alphabet is a contiguous block for A-Z, a-z
+# (and sometimes 0-9), except for a few letters that Unicode had already
+# encoded in the Letterlike Symbols block (e.g. italic "h" is U+210E). The
+# tables are built once at import time; styling a caption is then a single
+# str.translate call instead of a Python-level loop over every character.
+# ------------------------------------------------------------------------------
+
+# alphabet name -> (uppercase A, lowercase a, digit 0 or None, holes)
+_ALPHABETS = {
+    "bold": (0x1D400, 0x1D41A, 0x1D7CE, {}),
+    "italic": (0x1D434, 0x1D44E, None, {"h": 0x210E}),
+    "bold_italic": (0x1D468, 0x1D482, None, {}),
+    "script": (0x1D49C, 0x1D4B6, None, {
+        "B": 0x212C, "E": 0x2130, "F": 0x2131, "H": 0x210B, "I": 0x2110,
+        "L": 0x2112, "M": 0x2133, "R": 0x211B, "e": 0x212F, "g": 0x210A,
+        "o": 0x2134,
+    }),
+    "bold_script": (0x1D4D0, 0x1D4EA, None, {}),
+    "fraktur": (0x1D504, 0x1D51E, None, {
+        "C": 0x212D, "H": 0x210C, "I": 0x2111, "R": 0x211C, "Z": 0x2128,
+    }),
+    "double_struck": (0x1D538, 0x1D552, 0x1D7D8, {
+        "C": 0x2102, "H": 0x210D, "N": 0x2115, "P": 0x2119, "Q": 0x211A,
+        "R": 0x211D, "Z": 0x2124,
+    }),
+    "bold_fraktur": (0x1D56C, 0x1D586, None, {}),
+    "sans": (0x1D5A0, 0x1D5BA, 0x1D7E2, {}),
+    "sans_bold": (0x1D5D4, 0x1D5EE, 0x1D7EC, {}),
+    "sans_italic": (0x1D608, 0x1D622, None, {}),
+    "sans_bold_italic": (0x1D63C, 0x1D656, None, {}),
+    "monospace": (0x1D670, 0x1D68A, 0x1D7F6, {}),
+}
+
+def _build_table(upper: int, lower: int, digit, holes) -> dict:
+    table = {}
+    for i in range(26):
+        table[ord("A") + i] = chr(upper + i)
+        table[ord("a") + i] = chr(lower + i)
+    if digit is not None:
+        for i in range(10):
+            table[ord("0") + i] = chr(digit + i)
+    for ch, code in holes.items():
+        table[ord(ch)] = chr(code)
+    return table
+
+TABLES = {name: _build_table(*spec) for name, spec in _ALPHABETS.items()}
+ALPHABETS = tuple(TABLES)
+
+def style(text: str, alphabet: str = "sans") -> str:
+    return text.translate(TABLES[alphabet])
+
+# ------------------------------------------------------------------------------
+# Convert text to Mathematical Sans-Serif Plain (non bold, non italic)
+# ------------------------------------------------------------------------------
+_SANS = TABLES["sans"]
+
+def to_math_sans_plain(text: str) -> str:
+    return text.translate(_SANS)
+
+# ------------------------------------------------------------------------------
+# Format numbering (e.g., state 33 becomes "033" converted to Unicode).
+# The first thousand numbers are precomputed, which covers every counter the
+# bots realistically reach; larger values fall back to translate.
+# ------------------------------------------------------------------------------
+_NUMBERS = tuple(str(n).zfill(3).translate(_SANS) for n in range(1000))
+
+def format_number(num: int) -> str:
+    if 0 <= num < 1000:
+        return _NUMBERS[num]
+    return str(num).zfill(3).translate(_SANS)